@@ -0,0 +1,69 @@
+import random
+from typing import Callable
+
+from kpa_gateway.frame_parser import FRAME_TYPES, GatewayFrame
+from kpa_gateway.frame_types.address_telemetry import AddrTelParameter, GatewayAddrTel
+from kpa_gateway.frame_types.base_types import FrameCMDArgType
+from kpa_gateway.frame_types.control_command import GatewayCMD
+from kpa_gateway.frame_types.message import GatewayLogMessage, GatewayMessage
+from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
+from kpa_gateway.frame_types.receipt import GatewayReceipt
+
+from benchmarks.harness import benchmark, time_op
+
+
+rnd = random.Random(42)
+
+SCALAR_ARGS: list[tuple[FrameCMDArgType, int | float]] = [
+    (FrameCMDArgType.BYTE, 200), (FrameCMDArgType.BYTE_SIGN, -5), (FrameCMDArgType.WORD, 4000),
+    (FrameCMDArgType.WORD_SIGN, -4000), (FrameCMDArgType.DWORD, 70000), (FrameCMDArgType.DWORD_SIGN, -70000),
+    (FrameCMDArgType.REAL, 1.5), (FrameCMDArgType.DOUBLE, 2.25),
+]
+
+
+def _addr_tel(amount: int) -> GatewayAddrTel:
+    return GatewayAddrTel(*[AddrTelParameter(arg_num, rnd.randrange(1, 8), rnd.randbytes(rnd.choice((1, 2, 4, 8))))
+                            for arg_num in range(amount)])
+
+
+def _cmd(amount: int) -> GatewayCMD:
+    args: list[tuple[FrameCMDArgType, object]] = []
+    for i in range(amount):
+        if i % 10 == 8:
+            args.append((FrameCMDArgType.STRING, f'parameter-{i}'))
+        elif i % 10 == 9:
+            args.append((FrameCMDArgType.MBYTE, rnd.randbytes(16)))
+        else:
+            args.append(SCALAR_ARGS[i % len(SCALAR_ARGS)])
+    return GatewayCMD(3, 17, *args)  # type: ignore
+
+
+FRAMES: dict[str, Callable[[], FRAME_TYPES]] = {
+    'receipt': lambda: GatewayReceipt(2, 0, 'done'),
+    'cmd_small': lambda: GatewayCMD(1, 2, (FrameCMDArgType.WORD, 77), (FrameCMDArgType.DWORD, 5)),
+    'cmd_large': lambda: _cmd(200),
+    'pos_tel': lambda: GatewayPosTel(1, rnd.randbytes(256)),
+    'addr_tel_small': lambda: _addr_tel(8),
+    'addr_tel_large': lambda: _addr_tel(1000),
+    'message': lambda: GatewayMessage('first line', 'second line', 'third line'),
+    'log_message': lambda: GatewayLogMessage(1, 'gateway log line ' * 4),
+}
+
+
+def _register(name: str, make: Callable[[], FRAME_TYPES]) -> None:
+    @benchmark(f'codec.encode.{name}')
+    def encode() -> dict:
+        frame = GatewayFrame(make())
+        def op() -> None:
+            frame.frame.invalidate()  # measure a real encode, not the cached bytes
+            frame.to_bytes()
+        return time_op(op)
+
+    @benchmark(f'codec.parse.{name}')
+    def parse() -> dict:
+        raw: bytes = GatewayFrame(make()).to_bytes()
+        return time_op(lambda: GatewayFrame.parse(raw))
+
+
+for frame_name, frame_factory in FRAMES.items():
+    _register(frame_name, frame_factory)
@@ -0,0 +1,41 @@
+import statistics
+import time
+from typing import Any, Callable
+
+
+BENCHMARKS: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    def decorator(func: Callable[[], dict[str, Any]]) -> Callable[[], dict[str, Any]]:
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def time_op(op: Callable[[], Any], min_time: float = 0.2, repeat: int = 5) -> dict[str, Any]:
+    """Times `op` in batches of at least `min_time` seconds and reports the best and median batch."""
+    number: int = 1
+    while True:
+        started: float = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed: float = time.perf_counter() - started
+        if elapsed >= min_time / 10 or number >= 1 << 24:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    samples: list[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            op()
+        samples.append((time.perf_counter() - started) / number * 1e9)
+    return {'value': min(samples), 'unit': 'ns/op', 'median': statistics.median(samples), 'loops': number}
+
+
+def percentiles(samples_ns: list[int]) -> dict[str, float]:
+    ordered: list[int] = sorted(samples_ns)
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1000
+    return {'p50_us': pick(0.5), 'p99_us': pick(0.99), 'p999_us': pick(0.999), 'max_us': ordered[-1] / 1000}
@@ -0,0 +1,70 @@
+from threading import Event
+import time
+
+from loguru import logger
+from python_tcp.client import SocketClient
+
+from kpa_gateway.api_gateway import API_Gateway
+from kpa_gateway.deframer import Deframer
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.base_types import FrameCMDArgType
+from kpa_gateway.frame_types.control_command import GatewayCMD
+
+from benchmarks.harness import benchmark, percentiles
+
+
+LOOPBACK_PORT = 4917
+ROUND_TRIPS = 2000
+
+
+@benchmark('loopback.cmd_receipt_rtt')
+def cmd_receipt_rtt() -> dict:
+    logger.disable('kpa_gateway')
+    # the handler registry is class level, restore it so the benchmark handler does not outlive the run
+    cmd_handlers: dict[int, dict] = {key: dict(value) for key, value in GatewayCMD._registered.items()}
+    try:
+        samples, elapsed = _round_trips()
+    finally:
+        GatewayCMD._registered.clear()
+        GatewayCMD._registered.update(cmd_handlers)
+        logger.enable('kpa_gateway')
+    stats: dict = percentiles(samples)
+    return {'value': stats['p50_us'], 'unit': 'us', **stats, 'round_trips_per_sec': ROUND_TRIPS / elapsed}
+
+
+def _round_trips() -> tuple[list[int], float]:
+    gateway = API_Gateway(port=LOOPBACK_PORT)
+
+    @gateway.control_command(cmd_type=251, cmd_code=1)
+    def cmd_handler(*args) -> bool:
+        return True
+
+    deframer = Deframer()
+    receipt = Event()
+
+    def on_received(data: bytes) -> None:
+        for _ in deframer.feed(data):
+            receipt.set()
+
+    gateway.start()
+    client = SocketClient('127.0.0.1', LOOPBACK_PORT)
+    client.received.subscribe(on_received)
+    try:
+        client.connect()
+        time.sleep(0.2)
+        raw: bytes = GatewayFrame(GatewayCMD(251, 1, (FrameCMDArgType.WORD, 1))).to_bytes()
+        samples: list[int] = []
+        started: float = time.perf_counter()
+        for _ in range(ROUND_TRIPS):
+            receipt.clear()
+            sent_ns: int = time.perf_counter_ns()
+            client.send(raw)
+            if not receipt.wait(1):
+                raise TimeoutError('no receipt within 1 s')
+            samples.append(time.perf_counter_ns() - sent_ns)
+        return samples, time.perf_counter() - started
+    finally:
+        try:
+            client.disconnect()
+        finally:
+            gateway.stop()
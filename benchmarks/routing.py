@@ -0,0 +1,56 @@
+from kpa_gateway.api_gateway import API_Gateway
+from kpa_gateway.capture import NullSocket
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.base_types import FrameCMDArgType
+from kpa_gateway.frame_types.control_command import GatewayCMD
+from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
+
+from loguru import logger
+
+from benchmarks.harness import benchmark, time_op
+
+
+BENCH_CMD_TYPE = 250
+BENCH_TELEMETRY_TYPE = 250
+
+
+def _gateway() -> API_Gateway:
+    logger.disable('kpa_gateway')
+    gateway = API_Gateway(port=0)
+    gateway.frame_log.enabled = False
+
+    @gateway.control_command(cmd_type=BENCH_CMD_TYPE, cmd_code=1)
+    def cmd_handler(*args) -> bool:
+        return True
+
+    @gateway.position_telemetry(telemetry_type=BENCH_TELEMETRY_TYPE)
+    def tmi_handler(app, tmi_data: bytes) -> None:
+        pass
+
+    return gateway
+
+
+def _register(name: str, raw: bytes) -> None:
+    @benchmark(f'route.{name}')
+    def route() -> dict:
+        # handler registries are class level, restore them so the benchmark handlers do not outlive the run
+        cmd_handlers: dict[int, dict] = {key: dict(value) for key, value in GatewayCMD._registered.items()}
+        tmi_handlers: dict = dict(GatewayPosTel._registered)
+        gateway: API_Gateway = _gateway()
+        sock = NullSocket()
+        try:
+            return time_op(lambda: gateway.route_frame(raw, sock))
+        finally:
+            gateway.stop()
+            GatewayCMD._registered.clear()
+            GatewayCMD._registered.update(cmd_handlers)
+            GatewayPosTel._registered.clear()
+            GatewayPosTel._registered.update(tmi_handlers)
+            logger.enable('kpa_gateway')
+
+
+_register('cmd_handled', GatewayFrame(GatewayCMD(BENCH_CMD_TYPE, 1, (FrameCMDArgType.WORD, 1),
+                                                  (FrameCMDArgType.DOUBLE, 1.5))).to_bytes())
+_register('cmd_unrouted', GatewayFrame(GatewayCMD(BENCH_CMD_TYPE, 2, (FrameCMDArgType.WORD, 1))).to_bytes())
+_register('pos_tel_handled', GatewayFrame(GatewayPosTel(BENCH_TELEMETRY_TYPE, bytes(256))).to_bytes())
+_register('pos_tel_unrouted', GatewayFrame(GatewayPosTel(BENCH_TELEMETRY_TYPE + 1, bytes(256))).to_bytes())
@@ -0,0 +1,66 @@
+import argparse
+import json
+import platform
+from pathlib import Path
+import sys
+import time
+from typing import Any
+
+from benchmarks import bench_codecs, loopback, routing  # noqa: F401  importing the suites registers them
+from benchmarks.harness import BENCHMARKS
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    regressions: list[str] = []
+    for name, result in results.items():
+        base: dict | None = baseline.get(name)
+        if not base or not base.get('value'):
+            print(f'{name:<40} {result["value"]:>12.1f} {result["unit"]:<8} (no baseline)')
+            continue
+        ratio: float = result['value'] / base['value']
+        mark: str = ''
+        if ratio > 1 + threshold:
+            mark = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            mark = '  faster'
+        print(f'{name:<40} {result["value"]:>12.1f} {result["unit"]:<8} x{ratio:.2f} vs baseline{mark}')
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='KPA gateway benchmarks')
+    parser.add_argument('-k', '--filter', default='', help='run benchmarks whose name contains this substring')
+    parser.add_argument('-o', '--output', type=Path, help='save results as JSON')
+    parser.add_argument('-b', '--baseline', type=Path, help='compare against a saved JSON result')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1, help='relative change treated as significant')
+    parser.add_argument('--list', action='store_true', help='list benchmark names and exit')
+    args = parser.parse_args(argv)
+
+    names: list[str] = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    results: dict[str, dict] = {}
+    for name in names:
+        try:
+            results[name] = BENCHMARKS[name]()
+        except Exception as err:  # one broken benchmark should not hide the others
+            print(f'{name:<40} failed: {err!r}', file=sys.stderr)
+            continue
+        if not args.baseline:
+            print(f'{name:<40} {results[name]["value"]:>12.1f} {results[name]["unit"]}')
+
+    regressions: list[str] = []
+    if args.baseline:
+        baseline: dict[str, dict] = json.loads(args.baseline.read_text())['results']
+        regressions = compare(results, baseline, args.threshold)
+    if args.output:
+        report: dict[str, Any] = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+    return 1 if regressions else 0
@@ -1,77 +1,580 @@
-from typing import Callable, Iterable
+import asyncio
+from concurrent.futures import Future
+import inspect
+from socket import SHUT_RDWR, socket
+import time
+from typing import Any, Callable, Hashable, Iterable
 from python_tcp.server import ReceivedData, SocketServer
 from loguru import logger
-from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.async_server import AsyncConnection, AsyncSocketServer
+from kpa_gateway.capture import TrafficRecorder
+from kpa_gateway.commands import CommandTracker
+from kpa_gateway.deframer import Deframer
+from kpa_gateway.executor import KeyedExecutor
+from kpa_gateway.fanout import TELEMETRY_FRAME_IDS, FanOut, OverflowPolicy, Subscription
+from kpa_gateway.frame_log import FrameLogger
+from kpa_gateway.frame_template import FrameTemplate
+from kpa_gateway.ingress import IngressAction, IngressBacklog, IngressLimiter
+from kpa_gateway.last_value import LastValueCache
+from kpa_gateway.frame_parser import FRAME_TYPES, FrameHeader, GatewayFrame
+from kpa_gateway.frame_types.address_telemetry import AddrTelParameter, GatewayAddrTel
 from kpa_gateway.frame_types.base_types import FrameID
 from kpa_gateway.frame_types.control_command import GatewayCMD
 from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
 from kpa_gateway.frame_types.receipt import GatewayReceipt
-from kpa_gateway.worker import Worker
+from kpa_gateway.metrics import GatewayMetrics, MetricsServer
+from kpa_gateway.outbound import ClientRole, OutboundQueue
+from kpa_gateway.sharding import SHARDED_FRAME_IDS, ShardBy, ShardPool, roles_from_bits
+from kpa_gateway.tmi_store import TmiStore
+from kpa_gateway.utils import Direction
+from kpa_gateway.worker import Scheduler, Worker
+
+
+FRAME_IDS: frozenset[int] = frozenset(frame_id.value for frame_id in FrameID)
+
+
+def _telemetry_type(frame: FRAME_TYPES) -> int | None:
+    if isinstance(frame, GatewayPosTel):
+        return frame.telemetry_type
+    if isinstance(frame, GatewayAddrTel) and frame.args:
+        return frame.args[0].telemetry_type
+    return None
 
 
 class API_Gateway:
-    def __init__(self, port: int = 4000, ats_ip: str = '', feeder_module_ip: str = '') -> None:
+    def __init__(self, port: int = 4000, ats_ip: str = '', feeder_module_ip: str = '', *,
+                 use_asyncio: bool = False, handler_workers: int = 0, handler_queue_size: int = 1024,
+                 metrics_port: int | None = None, frame_log: FrameLogger | None = None,
+                 send_queue_size: int = 4096, send_flush_deadline: float = 0.001,
+                 ingress: IngressLimiter | None = None) -> None:
         self.port: int = port
-        self.server = SocketServer(self.port)
+        self.send_queue_size: int = send_queue_size
+        self.send_flush_deadline: float = send_flush_deadline
+        self.frame_log: FrameLogger = frame_log if frame_log else FrameLogger()
+        self.ingress: IngressLimiter | None = ingress
+        self.metrics = GatewayMetrics()
+        self.metrics.registry.add_collector(self._collect_metrics)
+        self.metrics_server: MetricsServer | None = None
+        if metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics.registry, metrics_port)
+        self.executor: KeyedExecutor | None = None
+        if handler_workers > 0:
+            self.executor = KeyedExecutor(handler_workers, handler_queue_size)
+        self.use_asyncio: bool = use_asyncio
+        self.server: SocketServer | AsyncSocketServer
+        if use_asyncio:
+            self.server = AsyncSocketServer(self.port, self.route_frame_async,
+                                            on_error=lambda err, conn: self._on_bad_input(conn, 'deframe'),
+                                            on_connected=lambda conn: self._register_client(conn.ip, conn),
+                                            on_disconnected=lambda conn: self._unregister_client(conn.ip, conn))
+        else:
+            self.server = SocketServer(self.port)
+            self.server.received.subscribe(self.route)
+            self.server.connected.subscribe(self._on_connected)
+            self.server.disconnected.subscribe(self._on_disconnected)
         self.server.label = 'API_Gateway'
-        self.server.received.subscribe(self.route)
+        self._deframers: dict[socket, Deframer] = {}
         self.workers: dict[str, Worker] = {}
+        self.scheduler = Scheduler('API_Gateway_scheduler')
         self.ats_ip: str = ats_ip
         self.feeder_module_ip: str = feeder_module_ip
         self.ats_emulator_ip = '127.0.0.1'
+        self.roles: dict[str, set[ClientRole]] = {}  # one host may be e.g. both the ATS and the feeder
+        self.clients_by_role: dict[ClientRole, OutboundQueue | AsyncConnection] = {}
+        self._outbound: dict[socket, OutboundQueue] = {}
+        self.set_role(self.ats_emulator_ip, ClientRole.EMULATOR)
+        self.set_role(feeder_module_ip, ClientRole.FEEDER)
+        self.set_role(ats_ip, ClientRole.ATS)
+        self.recorder: TrafficRecorder | None = None
+        self.tmi_store: TmiStore | None = None
+        self.last_values: LastValueCache | None = None
+        self.addr_tel_change_only: bool = False
+        self.addr_tel_forward: tuple[ClientRole, ...] = ()
+        self.fanout = FanOut(on_remove=lambda subscription: self.metrics.forget_subscriber(subscription.name))
+        self.shards: ShardPool | None = None
+        self.commands = CommandTracker(lambda frame: self.send_to((ClientRole.ATS, ClientRole.EMULATOR), frame))
+        # the threaded server reads every client from python_tcp's receive path, so delayed frames are held here
+        # instead of sleeping on it; the asyncio server pauses reading the one connection instead
+        self._backlog: IngressBacklog | None = None
+        if ingress and not use_asyncio:
+            self._backlog = IngressBacklog(self._limit, self.route_frame)
 
     def route(self, data: ReceivedData) -> None:
+        deframer: Deframer | None = self._deframers.get(data.sock)
+        if deframer is None:
+            deframer = self._deframers.setdefault(data.sock, Deframer())
         try:
-            transport_frame: GatewayFrame = GatewayFrame.parse(data.msg)
-            logger.info(transport_frame)
-            if transport_frame.frame.frame_id == FrameID.CMD:
-                cmd_frame: GatewayCMD = transport_frame.frame  # type: ignore
-                func: Callable | None = cmd_frame.route(cmd_frame.cmd_type, cmd_frame.cmd_code)
-                if func:
-                    result: bool = func(*cmd_frame.args)
-                    response = GatewayFrame(GatewayReceipt(GatewayCMD.frame_id.value, not result))
-                    data.sock.send(response.to_bytes())
-            elif transport_frame.frame.frame_id == FrameID.POSITION_TELEMETRY:
-                pos_tel_frame: GatewayPosTel = transport_frame.frame  # type: ignore
-                func: Callable | None = pos_tel_frame.route(pos_tel_frame.telemetry_type)
-                if func:
-                    func(self, pos_tel_frame.tmi_data)
+            for raw_frame in deframer.feed(data.msg):
+                if self._backlog:
+                    if self._backlog.push(data.sock, raw_frame):  # behind frames already held back
+                        continue
+                    wait: float | None = self._limit(raw_frame, data.sock)
+                    if wait is None:
+                        continue
+                    if wait:
+                        self._backlog.defer(data.sock, raw_frame, wait)
+                        continue
+                self.route_frame(raw_frame, data.sock)
+        except ValueError as err:
+            self._on_bad_input(data.sock, 'deframe')
+            logger.error(err)
 
+    def _limit(self, raw_frame: bytes, sock: socket | AsyncConnection) -> float | None:
+        """Seconds to wait before routing the frame, None to drop it."""
+        action, wait = self.ingress.check(sock, raw_frame)  # type: ignore
+        if action is None:
+            return 0
+        if action == IngressAction.DELAY:
+            return wait
+        if action == IngressAction.NACK:
+            self._nack(raw_frame, sock)
+        elif action == IngressAction.DISCONNECT:
+            logger.warning(f'{self.ingress.name(sock)}: ingress limit exceeded, disconnecting')  # type: ignore
+            self._disconnect(sock)
+        return None
+
+    def _nack(self, raw_frame: bytes, sock: socket | AsyncConnection) -> None:
+        """Answers a limited command with a failed receipt numbered like the gateway's other answers to commands
+        (see `_reply`); other frames carry no receipt and are only dropped."""
+        try:
+            header: FrameHeader = GatewayFrame.peek(raw_frame)
+        except ValueError:
+            return
+        if header.frame_id == FrameID.CMD.value:
+            self._send_receipt(sock, False)
+
+    def _on_bad_input(self, sock: socket | AsyncConnection, stage: str) -> None:
+        """Counts malformed input against the connection's ingress error limit as well."""
+        self.metrics.parse_error(stage)
+        if self.ingress and self.ingress.error(sock) == IngressAction.DISCONNECT:
+            logger.warning(f'{self.ingress.name(sock)}: too much malformed input, disconnecting')
+            self._disconnect(sock)
+
+    def route_frame(self, raw_frame: bytes, sock: socket | AsyncConnection) -> None:
+        received_ns: int = time.perf_counter_ns()
+        try:
+            header: FrameHeader = GatewayFrame.peek(raw_frame)
+            if header.frame_id not in FRAME_IDS:
+                raise ValueError(f'Unknown frame id {header.frame_id}')
+            self.metrics.count(Direction.RX, header.frame_id, len(raw_frame))
+            self.frame_log.log(Direction.RX, header.frame_id, raw_frame, sock)
+            self._store(header, raw_frame)
+            handler: tuple[Hashable, Callable] | None = self._find_handler(header)
+            if not handler:
+                return
+            key, func = handler
+            if self.shards and header.frame_id in SHARDED_FRAME_IDS:
+                self.shards.submit(key, raw_frame, sock)
+            elif self.executor:
+                self.executor.submit(key, self._run_handler, raw_frame, func, sock, header.frame_id, received_ns)
+            else:
+                self._run_handler(raw_frame, func, sock, header.frame_id, received_ns)
         except ValueError as err:
+            self._on_bad_input(sock, 'frame')
+            logger.error(f'{err}: 0x{raw_frame.hex(" ").upper()}')
+
+    def _run_handler(self, raw_frame: bytes, func: Callable, sock: socket | AsyncConnection, frame_id: int,
+                     received_ns: int) -> None:
+        parse_hist, dispatch_hist, handler_hist = self.metrics.timings(frame_id)
+        try:
+            started_ns: int = time.perf_counter_ns()
+            dispatch_hist.observe((started_ns - received_ns) / 1e9)
+            parsed: GatewayFrame = GatewayFrame.parse(raw_frame, lazy=True)
+            frame: FRAME_TYPES = parsed.frame
+            parsed_ns: int = time.perf_counter_ns()
+            parse_hist.observe((parsed_ns - started_ns) / 1e9)
+            result: Any = func(*self._handler_args(frame, parsed.filetime))
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)  # async def handler outside of the event loop
+            handler_hist.observe((time.perf_counter_ns() - parsed_ns) / 1e9)
+            self._reply(frame, result, sock)
+        except ValueError as err:
+            self._on_bad_input(sock, 'frame')
             logger.error(err)
+        except Exception as err:
+            logger.exception(err)
+
+    async def route_frame_async(self, raw_frame: bytes, connection: AsyncConnection) -> None:
+        if self.ingress:
+            wait: float | None = self._limit(raw_frame, connection)
+            if wait is None:
+                return
+            if wait:
+                await asyncio.sleep(wait)  # the connection is not read meanwhile
+        received_ns: int = time.perf_counter_ns()
+        try:
+            header: FrameHeader = GatewayFrame.peek(raw_frame)
+            if header.frame_id not in FRAME_IDS:
+                raise ValueError(f'Unknown frame id {header.frame_id}')
+            self.metrics.count(Direction.RX, header.frame_id, len(raw_frame))
+            self.frame_log.log(Direction.RX, header.frame_id, raw_frame, connection)
+            self._store(header, raw_frame)
+            handler: tuple[Hashable, Callable] | None = self._find_handler(header)
+            if not handler:
+                return
+            key, func = handler
+            if self.shards and header.frame_id in SHARDED_FRAME_IDS:
+                if not self.shards.try_submit(key, raw_frame, connection):
+                    await asyncio.to_thread(self.shards.submit, key, raw_frame, connection)
+                return
+            if self.executor:
+                task: tuple = (key, self._run_handler, raw_frame, func, connection, header.frame_id, received_ns)
+                if not self.executor.try_submit(*task):
+                    await asyncio.to_thread(self.executor.submit, *task)  # wait for a slot off the loop
+                return
+            parse_hist, dispatch_hist, handler_hist = self.metrics.timings(header.frame_id)
+            started_ns: int = time.perf_counter_ns()
+            dispatch_hist.observe((started_ns - received_ns) / 1e9)
+            parsed: GatewayFrame = GatewayFrame.parse(raw_frame, lazy=True)
+            frame: FRAME_TYPES = parsed.frame
+            parsed_ns: int = time.perf_counter_ns()
+            parse_hist.observe((parsed_ns - started_ns) / 1e9)
+            result: Any = func(*self._handler_args(frame, parsed.filetime))
+            if inspect.isawaitable(result):
+                result = await result
+            handler_hist.observe((time.perf_counter_ns() - parsed_ns) / 1e9)
+            self._reply(frame, result, connection)
+        except ValueError as err:
+            self._on_bad_input(connection, 'frame')
+            logger.error(f'{err}: 0x{raw_frame.hex(" ").upper()}')
+        except Exception as err:  # a failing handler must not end the client's connection
+            logger.exception(err)
+
+    def _store(self, header: FrameHeader, raw_frame: bytes) -> None:
+        if self.tmi_store and header.frame_id == FrameID.POSITION_TELEMETRY.value:
+            self.tmi_store.append_frame(raw_frame, header.telemetry_type, header.filetime)  # type: ignore
+
+    def _find_handler(self, header: FrameHeader) -> tuple[Hashable, Callable] | None:
+        if header.frame_id == FrameID.CMD.value:
+            func: Callable | None = GatewayCMD.route(header.cmd_type, header.cmd_code)  # type: ignore
+            return ((FrameID.CMD, header.cmd_type, header.cmd_code), func) if func else None
+        if header.frame_id == FrameID.POSITION_TELEMETRY.value:
+            func = GatewayPosTel.route(header.telemetry_type)  # type: ignore
+            return ((FrameID.POSITION_TELEMETRY, header.telemetry_type), func) if func else None
+        if header.frame_id == FrameID.RECEIPT.value:
+            return ((FrameID.RECEIPT,), self.commands.on_receipt) if self.commands.in_flight else None
+        if header.frame_id == FrameID.ADDRESS_TELEMETRY.value:
+            if self.last_values is None and not self.addr_tel_forward and not GatewayAddrTel._registered:
+                return None
+            return (FrameID.ADDRESS_TELEMETRY,), self._on_address_telemetry
+        return None
+
+    def _handler_args(self, frame: FRAME_TYPES, filetime: int) -> tuple:
+        if frame.frame_id == FrameID.CMD:
+            return tuple(frame.args)  # type: ignore
+        if frame.frame_id == FrameID.ADDRESS_TELEMETRY:
+            return (frame, filetime)
+        if frame.frame_id == FrameID.RECEIPT:
+            return (frame,)
+        return (self, frame.tmi_data)  # type: ignore
+
+    def _on_address_telemetry(self, frame: GatewayAddrTel, filetime: int) -> None:
+        params: list[AddrTelParameter] = frame.args
+        if self.last_values is not None:
+            changed: list[AddrTelParameter] = self.last_values.update(params, filetime)
+            if self.addr_tel_change_only:
+                params = changed
+        if not params:
+            return
+        by_type: dict[int, list[AddrTelParameter]] = {}
+        for param in params:
+            by_type.setdefault(param.telemetry_type, []).append(param)
+        for telemetry_type, group in by_type.items():
+            func: Callable | None = GatewayAddrTel.route(telemetry_type)
+            if func:
+                func(self, group)
+        if self.addr_tel_forward:
+            forwarded: GatewayAddrTel = frame if params is frame.args else GatewayAddrTel(*params)
+            self.send_to(self.addr_tel_forward, GatewayFrame(forwarded))
+
+    def track_address_telemetry(self, cache: LastValueCache | None = None, change_only: bool = True,
+                                forward_to: tuple[ClientRole, ...] = ()) -> LastValueCache:
+        """Keeps the last value of every received address telemetry parameter in `cache`.
+
+        With `change_only` handlers (and forwarding to `forward_to` clients) get only parameters whose value changed
+        or left its deadband; `forward_to` clients are sent the whole table when they connect.
+        """
+        self.last_values = cache if cache is not None else LastValueCache()
+        self.addr_tel_change_only = change_only
+        self.addr_tel_forward = forward_to
+        return self.last_values
+
+    def send_snapshot(self, sink: OutboundQueue | AsyncConnection) -> int:
+        """Sends the current address telemetry table to one client; returns the number of frames."""
+        if self.last_values is None:
+            return 0
+        frames: list[GatewayFrame] = self.last_values.snapshot_frames()
+        for frame in frames:
+            data: bytes = frame.to_bytes()
+            sink.send(data)
+            self.metrics.count(Direction.TX, FrameID.ADDRESS_TELEMETRY.value, len(data))
+        return len(frames)
+
+    def handler_stats(self) -> dict[str, int | float]:
+        return self.executor.stats() if self.executor else {}
+
+    def metrics_snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        return self.metrics.snapshot()
+
+    def _collect_metrics(self) -> None:
+        for name, worker in self.workers.items():
+            self.metrics.worker_ticks.labels(name).set(worker.ticks)
+            self.metrics.worker_missed.labels(name).set(worker.missed)
+            self.metrics.worker_lateness.labels(name).set(worker.last_lateness)
+            self.metrics.worker_max_lateness.labels(name).set(worker.max_lateness)
+        for ip, client in list(self.server.clients.items()):
+            sink: OutboundQueue | AsyncConnection | None = self._outbound.get(client, client)  # type: ignore
+            if isinstance(sink, (OutboundQueue, AsyncConnection)):
+                self.metrics.send_queue_depth.labels(ip).set(sink.queue_depth())
+        if self.executor:
+            self.metrics.handler_pending.set(self.executor.stats()['pending'])
+        for subscription in self.fanout.subscriptions:
+            self.metrics.subscriber_depth.labels(subscription.name).set(subscription.depth)
+            self.metrics.subscriber_lag.labels(subscription.name).set(subscription.oldest_age())
+            self.metrics.subscriber_dropped.labels(subscription.name).set(subscription.dropped)
+            self.metrics.subscriber_conflated.labels(subscription.name).set(subscription.conflated)
+        if self.ingress:
+            for (limit, action), count in list(self.ingress.limited.items()):
+                self.metrics.ingress_limited.labels(limit, action).set(count)
+        if self._backlog:
+            self.metrics.ingress_held.set(self._backlog.depth())
+            self.metrics.ingress_limited.labels('backlog', 'drop').set(self._backlog.dropped)
+
+    def _reply(self, frame: FRAME_TYPES, result: Any, sock: socket | AsyncConnection) -> None:
+        if frame.frame_id == FrameID.CMD:
+            self._send_receipt(sock, bool(result))
+
+    def _send_receipt(self, sock: socket | AsyncConnection, ok: bool) -> None:
+        data: bytes = GatewayFrame(GatewayReceipt(GatewayCMD.frame_id.value, not ok)).to_bytes()
+        self._outbound.get(sock, sock).send(data)  # type: ignore
+        self.metrics.count(Direction.TX, FrameID.RECEIPT.value, len(data))
+        self.frame_log.log(Direction.TX, FrameID.RECEIPT.value, data)
+
+    def set_role(self, ip: str, role: ClientRole) -> None:
+        if not ip:
+            return
+        self.roles.setdefault(ip, set()).add(role)
+        if ip in self.server.clients:
+            client: Any = self.server.clients[ip]
+            self._register_client(ip, self._outbound.get(client, client))
+
+    def _register_client(self, ip: str, sink: OutboundQueue | AsyncConnection) -> None:
+        roles: set[ClientRole] = self.roles.get(ip, set())
+        for role in roles:
+            self.clients_by_role[role] = sink
+        if not roles.isdisjoint(self.addr_tel_forward):
+            self.send_snapshot(sink)
+
+    def _unregister_client(self, ip: str, sink: OutboundQueue | AsyncConnection) -> None:
+        for role in self.roles.get(ip, ()):
+            if self.clients_by_role.get(role) is sink:
+                del self.clients_by_role[role]
+        self.metrics.send_queue_depth.remove(ip)
+
+    def _on_connected(self, data: dict[str, socket]) -> None:
+        for ip, sock in data.items():
+            queue = OutboundQueue(sock, ip, self.send_queue_size, self.send_flush_deadline,
+                                  on_sent=self.server.transmited.emit)  # type: ignore
+            self._outbound[sock] = queue
+            self._register_client(ip, queue)
+
+    def _on_disconnected(self, data: dict[str, socket]) -> None:
+        for ip, sock in data.items():
+            self._deframers.pop(sock, None)
+            if self._backlog:
+                self._backlog.discard(sock)
+            queue: OutboundQueue | None = self._outbound.pop(sock, None)
+            if queue is not None:
+                self._unregister_client(ip, queue)
+                queue.close(timeout=0)
+
+    def send_stats(self) -> dict[str, dict[str, int | float]]:
+        return {queue.name: queue.stats() for queue in list(self._outbound.values())}
+
+    def _client_sink(self, ip: str) -> OutboundQueue | AsyncConnection | None:
+        client: Any = self.server.clients.get(ip)
+        return None if client is None else self._outbound.get(client, client)
+
+    def disconnect_client(self, ip: str) -> None:
+        client: Any = self.server.clients.get(ip)
+        if client is not None:
+            self._disconnect(client)
+
+    @staticmethod
+    def _disconnect(client: socket | AsyncConnection) -> None:
+        if isinstance(client, AsyncConnection):
+            client.close()
+            return
+        try:
+            client.shutdown(SHUT_RDWR)
+        except OSError as err:
+            logger.debug(f'{client}: {err}')
+
+    def subscribe(self, name: str, callback: Callable[[bytes], None],
+                  frame_ids: Iterable[FrameID] = TELEMETRY_FRAME_IDS, telemetry_types: Iterable[int] | None = None, *,
+                  max_queue: int = 1024, policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                  on_disconnect: Callable[[Subscription], None] | None = None) -> Subscription:
+        """Delivers every frame sent through `send_to` (and so `send_ats`/`send_feeder`) matching the filters to
+        `callback` from the subscription's own thread."""
+        return self.fanout.add(Subscription(name, callback, frame_ids, telemetry_types, max_queue=max_queue,
+                                            policy=policy, on_disconnect=on_disconnect))
+
+    def subscribe_client(self, ip: str, frame_ids: Iterable[FrameID] = TELEMETRY_FRAME_IDS,
+                         telemetry_types: Iterable[int] | None = None, *, max_queue: int = 1024,
+                         policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                         send_timeout: float = 1.0) -> Subscription:
+        """Subscribes a connected client; the DISCONNECT policy drops its connection when it falls behind."""
+        def deliver(data: bytes) -> None:
+            sink: OutboundQueue | AsyncConnection | None = self._client_sink(ip)
+            if sink is not None and not sink.put(data, send_timeout):
+                raise TimeoutError(f'{ip} did not take the frame within {send_timeout} s')
+
+        return self.subscribe(f'client_{ip}', deliver, frame_ids, telemetry_types, max_queue=max_queue, policy=policy,
+                              on_disconnect=lambda subscription: self.disconnect_client(ip))
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.fanout.remove(subscription)
+
+    def subscription_stats(self) -> dict[str, dict[str, int | float | str]]:
+        return self.fanout.stats()
+
+    def start_capture(self, path: str) -> TrafficRecorder:
+        if self.use_asyncio:
+            raise RuntimeError('Traffic capture needs the SocketServer received/transmited events')
+        self.stop_capture()
+        self.recorder = TrafficRecorder(path).attach(self.server)  # type: ignore
+        return self.recorder
+
+    def stop_capture(self) -> None:
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def start_tmi_store(self, store: TmiStore | str) -> TmiStore:
+        """Stores every received POSITION_TELEMETRY payload in `store` (or a TmiStore with default settings at the
+        given path), whether or not a handler is registered for its telemetry type."""
+        self.stop_tmi_store()
+        self.tmi_store = store if isinstance(store, TmiStore) else TmiStore(store)
+        return self.tmi_store
+
+    def stop_tmi_store(self) -> None:
+        if self.tmi_store:
+            self.tmi_store.close()
+            self.tmi_store = None
+
+    def start_sharding(self, workers: int | None = None, shard_by: ShardBy = ShardBy.CONNECTION,
+                       ring_size: int = 4 * 1024 * 1024, mp_context: str | None = None) -> ShardPool:
+        """Moves parsing and handlers of CMD and POSITION_TELEMETRY frames to `workers` processes.
+
+        Call it before `start` and after the handlers are registered. Position telemetry handlers get a
+        ShardContext (with send_to/send_ats/send_feeder) instead of the gateway, and handler timings are not
+        measured in this mode.
+        """
+        self.stop_sharding()
+        self.shards = ShardPool(self._on_shard_return, workers, shard_by, ring_size, mp_context=mp_context)
+        self.shards.start()
+        return self.shards
+
+    def stop_sharding(self) -> None:
+        if self.shards:
+            self.shards.stop()
+            self.shards = None
+
+    def _on_shard_return(self, connection: Any, role_bits: int, data: bytes) -> None:
+        if role_bits:
+            self.send_to(roles_from_bits(role_bits), GatewayFrame.parse(data))
+        elif connection is not None:
+            self._outbound.get(connection, connection).send(data)
+            self.metrics.count(Direction.TX, FrameID.RECEIPT.value, len(data))
+            self.frame_log.log(Direction.TX, FrameID.RECEIPT.value, data)
 
     def add_worker(self, target: Callable, name: str | None = None, period_sec: float = 5, args: Iterable = []) -> None:
         worker_name = f'{target.__name__}_worker' if not name else name
-        self.workers.update({worker_name: Worker(name=worker_name, period_sec=period_sec, target=target, args=args)})
+        self.workers.update({worker_name: Worker(name=worker_name, period_sec=period_sec, target=target, args=args,
+                                                    scheduler=self.scheduler)})
 
     def get_worker(self, name: str) -> Worker | None:
         return self.workers.get(name, None)
 
     def start(self) -> None:
+        self.frame_log.start()
         self.server.start_server()
+        if self.metrics_server:
+            self.metrics_server.start()
         # [worker.start() for worker in self.workers.values()]
 
     def stop(self) -> None:
         self.server.stop()
+        for queue in list(self._outbound.values()):
+            queue.close()
+        self._outbound.clear()
+        self.clients_by_role.clear()
+        if self._backlog:
+            self._backlog.clear()
+        self.fanout.close()
+        self.commands.close()
+        self.stop_sharding()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.stop_capture()
+        self.stop_tmi_store()
+        self.frame_log.stop()
         [worker.stop() for worker in self.workers.values()]
+        self.scheduler.shutdown()
+        if self.executor:
+            self.executor.shutdown(wait=False)
 
     def position_telemetry(self, telemetry_type: int) -> Callable:
         def decorator(func: Callable) -> None:
             GatewayPosTel.listen(telemetry_type, func)
         return decorator
 
+    def address_telemetry(self, telemetry_type: int) -> Callable:
+        """Handlers get the gateway and the list of this type's parameters of each received frame."""
+        def decorator(func: Callable) -> None:
+            GatewayAddrTel.listen(telemetry_type, func)
+        return decorator
+
     def control_command(self, cmd_type: int, cmd_code: int) -> Callable:
         def wrapper(func: Callable) -> None:
             GatewayCMD.listen(cmd_type, cmd_code, func)
         return wrapper
 
+    def send_to(self, roles: tuple[ClientRole, ...], frame: GatewayFrame) -> int:
+        """Queues the frame, encoded once, for every connected client of `roles`; returns the number of clients."""
+        return self.send_raw(roles, frame.to_bytes(), frame.frame.frame_id.value, _telemetry_type(frame.frame))
+
+    def send_template(self, roles: tuple[ClientRole, ...], template: FrameTemplate) -> int:
+        """Sends the template's current contents stamped with the current FILETIME."""
+        return self.send_raw(roles, template.render(), template.frame_id, template.telemetry_type)
+
+    def send_raw(self, roles: tuple[ClientRole, ...], data: bytes, frame_id: int,
+                 telemetry_type: int | None = None) -> int:
+        if self.fanout.subscriptions:
+            self.fanout.publish(frame_id, telemetry_type, data)
+        sinks: list[OutboundQueue | AsyncConnection] = []
+        for role in roles:
+            sink: OutboundQueue | AsyncConnection | None = self.clients_by_role.get(role)
+            if sink is not None and sink not in sinks:  # a client holding several of the roles gets one copy
+                sinks.append(sink)
+        for sink in sinks:
+            sink.send(data)
+        sent: int = len(sinks)
+        if sent:
+            self.metrics.count(Direction.TX, frame_id, len(data))
+            self.frame_log.log(Direction.TX, frame_id, data)
+        return sent
+
+    def send_command(self, frame: GatewayFrame | GatewayCMD, timeout: float | None = None,
+                     retries: int | None = None) -> Future[GatewayReceipt]:
+        """Sends a command to the ATS through `commands`; the future completes with its receipt."""
+        return self.commands.submit(frame, timeout, retries)
+
     def send_ats(self, frame: GatewayFrame) -> None:
-        if self.ats_emulator_ip in list(self.server.clients):
-            self.server.send_to_client(self.ats_emulator_ip, frame.to_bytes())
-        self.server.send_to_client(self.ats_ip, frame.to_bytes())
+        self.send_to((ClientRole.ATS, ClientRole.EMULATOR), frame)
 
     def send_feeder(self, frame: GatewayFrame) -> None:
-        self.server.send_to_client(self.feeder_module_ip, frame.to_bytes())
+        self.send_to((ClientRole.FEEDER,), frame)
 
     # def send(self, frame: GatewayFrame) -> None:
     #     self.server.send(frame.to_bytes())
@@ -0,0 +1,130 @@
+import asyncio
+from threading import Thread
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from kpa_gateway.deframer import Deframer
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class AsyncConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+        self.ip: str = writer.get_extra_info('peername')[0]
+        self.deframer = Deframer()
+        self._loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    def send(self, data: bytes) -> None:
+        if _running_loop() is self._loop:
+            self.writer.write(data)
+        else:
+            self._loop.call_soon_threadsafe(self.writer.write, data)
+
+    async def drain(self) -> None:
+        await self.writer.drain()
+
+    async def _write_drained(self, data: bytes) -> None:
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def put(self, data: bytes, timeout: float | None = None) -> bool:
+        """Writes from another thread and waits until the transport buffer is below its high-water mark."""
+        future = asyncio.run_coroutine_threadsafe(self._write_drained(data), self._loop)
+        try:
+            future.result(timeout)
+            return True
+        except (TimeoutError, ConnectionError):
+            future.cancel()
+            return False
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self.writer.close)
+
+    def queue_depth(self) -> int:
+        return self.writer.transport.get_write_buffer_size()
+
+
+class AsyncSocketServer:
+    """asyncio counterpart of python_tcp.SocketServer used by API_Gateway(use_asyncio=True).
+
+    Each connection is served by one coroutine which reads with streaming reads, deframes and awaits `on_frame`
+    for every frame, then waits for the write buffer to drain before reading again.
+    """
+    def __init__(self, port: int, on_frame: Callable[[bytes, AsyncConnection], Awaitable[None]],
+                 read_size: int = 65536, *, on_error: Callable[[ValueError, AsyncConnection], None] | None = None,
+                 on_connected: Callable[[AsyncConnection], None] | None = None,
+                 on_disconnected: Callable[[AsyncConnection], None] | None = None) -> None:
+        self.port: int = port
+        self.label: str = 'AsyncSocketServer'
+        self.on_frame: Callable[[bytes, AsyncConnection], Awaitable[None]] = on_frame
+        self.on_error: Callable[[ValueError, AsyncConnection], None] | None = on_error
+        self.on_connected: Callable[[AsyncConnection], None] | None = on_connected
+        self.on_disconnected: Callable[[AsyncConnection], None] | None = on_disconnected
+        self.read_size: int = read_size
+        self.clients: dict[str, AsyncConnection] = {}
+        self._server: asyncio.Server | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: Thread | None = None
+
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_client, port=self.port)
+        logger.debug(f'{self.label} listening on port {self.port}')
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def start_server(self) -> None:
+        if self._thread is None:
+            self._thread = Thread(name=self.label, daemon=True, target=asyncio.run, args=(self.serve(),))
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            for connection in list(self.clients.values()):
+                self._loop.call_soon_threadsafe(connection.writer.close)
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def send_to_client(self, ip: str, data: bytes) -> None:
+        connection: AsyncConnection | None = self.clients.get(ip)
+        if connection is not None:
+            connection.send(data)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = AsyncConnection(reader, writer)
+        self.clients[connection.ip] = connection
+        logger.debug(f'{self.label}: {connection.ip} connected')
+        if self.on_connected:
+            self.on_connected(connection)
+        try:
+            while chunk := await reader.read(self.read_size):
+                try:
+                    for raw_frame in connection.deframer.feed(chunk):
+                        await self.on_frame(raw_frame, connection)
+                except ValueError as err:
+                    logger.error(err)
+                    if self.on_error:
+                        self.on_error(err, connection)
+                await connection.drain()
+        except ConnectionError as err:
+            logger.debug(f'{self.label}: {connection.ip} {err}')
+        finally:
+            if self.clients.get(connection.ip) is connection:
+                del self.clients[connection.ip]
+            writer.close()
+            if self.on_disconnected:
+                self.on_disconnected(connection)
+            logger.debug(f'{self.label}: {connection.ip} disconnected')
@@ -1,18 +1,14 @@
-from ast import literal_eval
 from pathlib import Path
-import struct
 from typing import Any
 from PyQt6 import QtWidgets
 from PyQt6.uic.load_ui import loadUi
 from kpa_gateway.ats_emulator.args_widgets import ATM_Arg, CMD_Arg, MsgArg, _add_arg
+from kpa_gateway.ats_emulator.frames import (addr_tel_frame, addr_tel_value, auto_receipt, cmd_arg, cmd_frame,
+                                             log_frame, message_frame, pos_tel_frame, receipt_frame)
 from kpa_gateway.ats_emulator.widgets import _Widgets
+from kpa_gateway.deframer import Deframer
 from kpa_gateway.frame_parser import GatewayFrame
-from kpa_gateway.frame_types.address_telemetry import AddrTelParameter, GatewayAddrTel
-from kpa_gateway.frame_types.base_types import FrameCMDArgType, FrameID
-from kpa_gateway.frame_types.control_command import GatewayCMD
-from kpa_gateway.frame_types.message import GatewayLogMessage, GatewayMessage
-from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
-from kpa_gateway.frame_types.receipt import GatewayReceipt
+from kpa_gateway.frame_types.base_types import FrameCMDArgType
 
 from python_tcp.client import SocketClient
 
@@ -25,8 +21,9 @@ class ATS_Emulator(QtWidgets.QWidget, _Widgets):
         self.setWindowTitle('Имитатор АИК')
         self.client = SocketClient(self.ip_line_edit.text(),
                                    self.port_spin_box.value())
+        self.deframer = Deframer()
         self.client.received.subscribe(self.on_received)
-        self.client.disconnected.subscribe(lambda: self.log_text_browser.append('Disconnected from server'))
+        self.client.disconnected.subscribe(lambda: self.log_view.append('Disconnected from server'))
         self.client.connected.subscribe(self.on_connected)
         self.receipt_arg_len_spin_box.valueChanged.connect(self.set_receipt_args)
         self.cmd_arg_len_spin_box.valueChanged.connect(self.set_cmd_args)
@@ -38,12 +35,17 @@ class ATS_Emulator(QtWidgets.QWidget, _Widgets):
         self.msg_args: list[MsgArg] = []
 
     def on_received(self, data: bytes) -> None:
-        frame: GatewayFrame = GatewayFrame.parse(data)
-        self.log_text_browser.append(str(frame))
-        is_autorecipe: bool = self.auto_receipt_check_box.isChecked()
-        if frame.frame.frame_id == FrameID.CMD and is_autorecipe:
-            answer = GatewayFrame(GatewayReceipt(frame.frame.cmd_code, 0))  # type: ignore
-            self.log_text_browser.append(str(answer))
+        try:
+            for raw_frame in self.deframer.feed(data):
+                self.on_frame(GatewayFrame.parse(raw_frame))
+        except ValueError as err:
+            self.log_view.append(str(err))
+
+    def on_frame(self, frame: GatewayFrame) -> None:
+        self.log_view.post(frame, 'rx')
+        answer: GatewayFrame | None = auto_receipt(frame) if self.auto_receipt_check_box.isChecked() else None
+        if answer:
+            self.log_view.post(answer, 'tx')
             self.client.send(answer.to_bytes())
 
     def set_msg_args(self, new_value: int) -> None:
@@ -62,45 +64,45 @@ class ATS_Emulator(QtWidgets.QWidget, _Widgets):
         receipt_num: int = self.receipt_type_spin_box.value()
         return_code: int = self.receipt_return_code_spin_box.value()
         args: list[str] = [arg.line_edit.text() for arg in self.receipt_args]
-        data = GatewayFrame(GatewayReceipt(receipt_num, return_code, *args))
-        self.log_text_browser.append(str(data))
+        data: GatewayFrame = receipt_frame(receipt_num, return_code, *args)
+        self.log_view.post(data, 'tx')
         self.client.send(data.to_bytes())
 
     def on_cmd_btn_pressed(self) -> None:
         cmd_type: int = self.cmd_type_spin_box.value()
         cmd_code: int  = self.cmd_code_spin_box.value()
-        args: list[tuple[FrameCMDArgType, Any]] = [(FrameCMDArgType(arg.arg_type.currentIndex() + 1),
-                                                    literal_eval(arg.line_edit.text()))
+        args: list[tuple[FrameCMDArgType, Any]] = [cmd_arg(arg.arg_type.currentIndex(), arg.line_edit.text())
                                                    for arg in self.cmd_args]
-        data = GatewayFrame(GatewayCMD(cmd_type, cmd_code, *args))
-        self.log_text_browser.append(str(data))
+        data: GatewayFrame = cmd_frame(cmd_type, cmd_code, *args)
+        self.log_view.post(data, 'tx')
         self.client.send(data.to_bytes())
 
     def on_atm_btn_pressed(self) -> None:
-        args: list[AddrTelParameter] = [AddrTelParameter(arg.atm_type.value(), arg.arg_num.value(),
-                                                         b''.join([struct.pack('<B', literal_eval(val))
-                                                                   for val in arg.line_edit.text()]),
-                                                         arg.arg_size.value())
-                                        for arg in self.atm_args]
-        data = GatewayFrame(GatewayAddrTel(*args))
-        self.log_text_browser.append(str(data))
+        try:
+            data: GatewayFrame = addr_tel_frame(*[(arg.atm_type.value(), arg.arg_num.value(),
+                                                   addr_tel_value(arg.line_edit.text()), arg.arg_size.value())
+                                                  for arg in self.atm_args])
+        except ValueError as err:  # ArgSize does not match the entered value
+            self.log_view.append(str(err))
+            return
+        self.log_view.post(data, 'tx')
         self.client.send(data.to_bytes())
 
     def on_ptm_btn_pressed(self) -> None:
         text: bytes = self.ptm_plain_text.toPlainText().encode('utf-8')
-        data = GatewayFrame(GatewayPosTel(self.ptm_type_spin_box.value(), text))
-        self.log_text_browser.append(str(data))
+        data: GatewayFrame = pos_tel_frame(self.ptm_type_spin_box.value(), text)
+        self.log_view.post(data, 'tx')
         self.client.send(data.to_bytes())
 
     def on_msg_btn_pressed(self) -> None:
         args: list[str] = [arg.line_edit.text() for arg in self.msg_args]
-        data = GatewayFrame(GatewayMessage(*args))
-        self.log_text_browser.append(str(data))
+        data: GatewayFrame = message_frame(*args)
+        self.log_view.post(data, 'tx')
         self.client.send(data.to_bytes())
 
     def on_log_btn_pressed(self) -> None:
-        data = GatewayFrame(GatewayLogMessage(self.log_type_spin_box.value(), self.log_line_edit.text()))
-        self.log_text_browser.append(str(data))
+        data: GatewayFrame = log_frame(self.log_type_spin_box.value(), self.log_line_edit.text())
+        self.log_view.post(data, 'tx')
         self.client.send(data.to_bytes())
 
     def on_connect_btn_pressed(self) -> None:
@@ -115,9 +117,10 @@ class ATS_Emulator(QtWidgets.QWidget, _Widgets):
             self.client.disconnect()
 
     def on_connected(self) -> None:
+        self.deframer.reset()
         ip: str = self.ip_line_edit.text()
         port: int = self.port_spin_box.value()
-        self.log_text_browser.append(f'Connected to server {ip}:{port}')
+        self.log_view.append(f'Connected to server {ip}:{port}')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+from ast import literal_eval
+import struct
+from typing import Any
+
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.address_telemetry import AddrTelParameter, GatewayAddrTel
+from kpa_gateway.frame_types.base_types import FrameCMDArgType, FrameID
+from kpa_gateway.frame_types.control_command import GatewayCMD
+from kpa_gateway.frame_types.message import GatewayLogMessage, GatewayMessage
+from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
+from kpa_gateway.frame_types.receipt import GatewayReceipt
+
+
+def cmd_arg(type_index: int, text: str) -> tuple[FrameCMDArgType, Any]:
+    return FrameCMDArgType(type_index + 1), literal_eval(text)
+
+
+def addr_tel_value(text: str) -> bytes:
+    return b''.join([struct.pack('<B', literal_eval(val)) for val in text])
+
+
+def receipt_frame(receipt_num: int, return_code: int, *strings: str) -> GatewayFrame:
+    return GatewayFrame(GatewayReceipt(receipt_num, return_code, *strings))
+
+
+def cmd_frame(cmd_type: int, cmd_code: int, *args: tuple[FrameCMDArgType, Any]) -> GatewayFrame:
+    return GatewayFrame(GatewayCMD(cmd_type, cmd_code, *args))
+
+
+def addr_tel_frame(*params: tuple[int, int, bytes, int]) -> GatewayFrame:
+    return GatewayFrame(GatewayAddrTel(*[AddrTelParameter(arg_num, telemetry_type, value, arg_size)
+                                         for telemetry_type, arg_num, value, arg_size in params]))
+
+
+def pos_tel_frame(telemetry_type: int, tmi_data: bytes) -> GatewayFrame:
+    return GatewayFrame(GatewayPosTel(telemetry_type, tmi_data))
+
+
+def message_frame(*strings: str) -> GatewayFrame:
+    return GatewayFrame(GatewayMessage(*strings))
+
+
+def log_frame(message_type: int, msg: str) -> GatewayFrame:
+    return GatewayFrame(GatewayLogMessage(message_type, msg))
+
+
+def auto_receipt(frame: GatewayFrame) -> GatewayFrame | None:
+    if frame.frame.frame_id == FrameID.CMD:
+        return receipt_frame(frame.frame.cmd_code, 0)  # type: ignore
+    return None
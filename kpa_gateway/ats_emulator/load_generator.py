@@ -0,0 +1,188 @@
+import argparse
+from collections import deque
+import json
+import random
+from threading import Lock, Thread
+import time
+from typing import Callable
+
+from loguru import logger
+from python_tcp.client import SocketClient
+
+from kpa_gateway.ats_emulator.frames import addr_tel_frame, cmd_frame, message_frame, pos_tel_frame
+from kpa_gateway.deframer import Deframer
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.base_types import FrameCMDArgType, FrameID
+
+
+FRAME_KINDS: tuple[str, ...] = ('cmd', 'pos_tel', 'addr_tel', 'message')
+
+
+def frame_builders(args: argparse.Namespace) -> dict[str, Callable[[], bytes]]:
+    rnd = random.Random(args.seed)
+    return {
+        'cmd': lambda: cmd_frame(args.cmd_type, args.cmd_code, (FrameCMDArgType.WORD, rnd.randrange(1 << 16)),
+                                 (FrameCMDArgType.DOUBLE, rnd.random())).to_bytes(),
+        'pos_tel': lambda: pos_tel_frame(args.telemetry_type, rnd.randbytes(args.pos_tel_size)).to_bytes(),
+        'addr_tel': lambda: addr_tel_frame(*[(args.telemetry_type, arg_num, rnd.randbytes(4), 4)
+                                             for arg_num in range(args.addr_tel_params)]).to_bytes(),
+        'message': lambda: message_frame('load generator', f'{rnd.random()}').to_bytes(),
+    }
+
+
+class LoadConnection:
+    """One ATS connection sending a frame mix at fixed rates.
+
+    The gateway does not echo a command id in its GatewayReceipt, so receipts are matched to commands in FIFO
+    order per connection. That holds as long as all commands of a connection share one (cmd_type, cmd_code).
+    `seed` fixes the phase offsets of the send schedules, so runs with the same seed send the same sequence.
+    """
+    def __init__(self, index: int, host: str, port: int, rates: dict[str, float],
+                 builders: dict[str, Callable[[], bytes]], *, pool_size: int = 64, seed: int | None = None) -> None:
+        self.index: int = index
+        self._random = random.Random(seed)
+        self.client = SocketClient(host, port)
+        self.client.received.subscribe(self.on_received)
+        self.rates: dict[str, float] = {kind: rate for kind, rate in rates.items() if rate > 0}
+        self.frames: dict[str, list[bytes]] = {kind: [builders[kind]() for _ in range(pool_size)]
+                                               for kind in self.rates}
+        self.sent: dict[str, int] = {kind: 0 for kind in FRAME_KINDS}
+        self.sent_bytes: int = 0
+        self.latencies_ns: list[int] = []
+        self.unexpected_receipts: int = 0
+        self.nack_receipts: int = 0
+        self._pending: deque[int] = deque()
+        self._deframer = Deframer()
+        self._lock = Lock()
+        self._thread: Thread | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def on_received(self, data: bytes) -> None:
+        now: int = time.perf_counter_ns()
+        try:
+            for raw_frame in self._deframer.feed(data):
+                if GatewayFrame.peek(raw_frame).frame_id != FrameID.RECEIPT.value:
+                    continue
+                with self._lock:
+                    if not self._pending:
+                        self.unexpected_receipts += 1
+                        continue
+                    self.latencies_ns.append(now - self._pending.popleft())
+                if GatewayFrame.parse(raw_frame).frame.return_code:  # type: ignore
+                    self.nack_receipts += 1
+        except ValueError as err:
+            logger.error(f'connection {self.index}: {err}')
+
+    def run(self, duration: float) -> None:
+        intervals: dict[str, float] = {kind: 1 / rate for kind, rate in self.rates.items()}
+        started: float = time.perf_counter()
+        deadlines: dict[str, float] = {kind: started + self._random.random() * interval
+                                       for kind, interval in intervals.items()}
+        stop_at: float = started + duration
+        while deadlines:
+            kind: str = min(deadlines, key=deadlines.__getitem__)
+            deadline: float = deadlines[kind]
+            if deadline >= stop_at:
+                break
+            delay: float = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool: list[bytes] = self.frames[kind]
+            raw_frame: bytes = pool[self.sent[kind] % len(pool)]
+            if kind == 'cmd':
+                with self._lock:
+                    self._pending.append(time.perf_counter_ns())
+            self.client.send(raw_frame)
+            self.sent[kind] += 1
+            self.sent_bytes += len(raw_frame)
+            deadlines[kind] = deadline + intervals[kind]
+
+    def start(self, duration: float) -> None:
+        self.client.connect()
+        self._thread = Thread(name=f'load_{self.index}', daemon=True, target=self.run, args=(duration,))
+        self._thread.start()
+
+    def join(self) -> None:
+        if self._thread:
+            self._thread.join()
+
+
+def percentile(ordered: list[int], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] / 1e6 if ordered else float('nan')
+
+
+def report(connections: list[LoadConnection], elapsed: float) -> dict:
+    latencies: list[int] = sorted(latency for conn in connections for latency in conn.latencies_ns)
+    sent: dict[str, int] = {kind: sum(conn.sent[kind] for conn in connections) for kind in FRAME_KINDS}
+    return {
+        'connections': len(connections),
+        'elapsed_sec': elapsed,
+        'sent': sent,
+        'frames_per_sec': {kind: count / elapsed for kind, count in sent.items()},
+        'total_frames_per_sec': sum(sent.values()) / elapsed,
+        'mbytes_per_sec': sum(conn.sent_bytes for conn in connections) / elapsed / 1e6,
+        'receipts': len(latencies),
+        'receipts_per_sec': len(latencies) / elapsed,
+        'nack_receipts': sum(conn.nack_receipts for conn in connections),
+        'lost_receipts': sum(conn.pending for conn in connections),
+        'unexpected_receipts': sum(conn.unexpected_receipts for conn in connections),
+        'latency_ms': {'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99),
+                       'p999': percentile(latencies, 0.999),
+                       'max': latencies[-1] / 1e6 if latencies else float('nan')},
+    }
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(prog='python -m kpa_gateway.ats_emulator.load_generator',
+                                     description='Headless ATS load generator for API_Gateway')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('-c', '--connections', type=int, default=1)
+    parser.add_argument('-d', '--duration', type=float, default=10, help='seconds of sending')
+    parser.add_argument('--drain', type=float, default=2, help='seconds to wait for outstanding receipts')
+    for kind in FRAME_KINDS:
+        parser.add_argument(f'--{kind.replace("_", "-")}-rate', type=float, default=100 if kind == 'cmd' else 0,
+                            help=f'{kind} frames per second over all connections')
+    # receipts come only for commands with a gateway handler; 2/3 is the one `python -m kpa_gateway` registers
+    parser.add_argument('--cmd-type', type=int, default=2)
+    parser.add_argument('--cmd-code', type=int, default=3)
+    parser.add_argument('--telemetry-type', type=int, default=1)
+    parser.add_argument('--pos-tel-size', type=int, default=256)
+    parser.add_argument('--addr-tel-params', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    builders: dict[str, Callable[[], bytes]] = frame_builders(args)
+    rates: dict[str, float] = {kind: getattr(args, f'{kind}_rate') / args.connections for kind in FRAME_KINDS}
+    connections: list[LoadConnection] = [LoadConnection(index, args.host, args.port, rates, builders,
+                                                        seed=args.seed + index)
+                                         for index in range(args.connections)]
+    started: float = time.perf_counter()
+    for conn in connections:
+        conn.start(args.duration)
+    for conn in connections:
+        conn.join()
+    elapsed: float = time.perf_counter() - started
+    drain_until: float = time.perf_counter() + args.drain
+    while any(conn.pending for conn in connections) and time.perf_counter() < drain_until:
+        time.sleep(0.01)
+    for conn in connections:
+        conn.client.disconnect()
+
+    result: dict = report(connections, elapsed)
+    if result['sent']['cmd'] and not result['receipts']:
+        logger.warning(f'no receipts for {result["sent"]["cmd"]} commands: does the gateway have a handler for '
+                       f'cmd_type {args.cmd_type}, cmd_code {args.cmd_code}?')
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=2)
+    return result
+
+
+if __name__ == '__main__':
+    main()
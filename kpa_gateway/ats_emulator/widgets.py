@@ -1,5 +1,7 @@
 from PyQt6 import QtWidgets
 
+from kpa_gateway.log_view import LogView
+
 class _Widgets:
     receipt_type_spin_box: QtWidgets.QSpinBox
     receipt_return_code_spin_box: QtWidgets.QSpinBox
@@ -32,6 +34,6 @@ class _Widgets:
     atm_v_layout: QtWidgets.QVBoxLayout
     messages_v_layout: QtWidgets.QVBoxLayout
 
-    log_text_browser: QtWidgets.QTextBrowser
+    log_view: LogView
 
     auto_receipt_check_box: QtWidgets.QCheckBox
\ No newline at end of file
@@ -0,0 +1,214 @@
+from array import array
+import mmap
+from pathlib import Path
+import socket
+import struct
+from threading import Lock
+import time
+from typing import Any, BinaryIO, Callable, Iterator, NamedTuple
+import weakref
+
+from loguru import logger
+from python_tcp.server import ReceivedData, SocketServer
+
+from kpa_gateway.deframer import DeframeError, Deframer
+from kpa_gateway.utils import Direction
+
+
+FILE_MAGIC = b'KPACAP01'
+RECORD_HEADER = struct.Struct('<QIBI')  # monotonic_ns, connection id, direction, payload length
+INDEX_ENTRY = struct.Struct('<Q')
+
+
+class CapturedFrame(NamedTuple):
+    timestamp_ns: int
+    connection_id: int
+    direction: Direction
+    data: memoryview
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + '.idx')
+
+
+def scan_offsets(buffer: Any) -> array:
+    """Record offsets found by walking the record headers of a capture file, for a missing index."""
+    offsets = array('Q')
+    ptr: int = len(FILE_MAGIC)
+    while ptr + RECORD_HEADER.size <= len(buffer):
+        end: int = ptr + RECORD_HEADER.size + RECORD_HEADER.unpack_from(buffer, ptr)[3]
+        if end > len(buffer):  # torn last record
+            break
+        offsets.append(ptr)
+        ptr = end
+    return offsets
+
+
+class TrafficRecorder:
+    """Appends whole gateway frames with monotonic timestamps to a capture file and a sidecar offset index.
+
+    Received chunks are deframed per connection so that every record holds exactly one frame. Transmitted data
+    comes from `SocketServer.transmited`, which carries no socket, so it is stored with connection id 0. Appending to
+    a capture whose index is missing rebuilds the index from the records first.
+    """
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        new_file: bool = not self.path.exists() or self.path.stat().st_size == 0
+        idx: Path = index_path(self.path)
+        if not new_file and not idx.exists():
+            with self.path.open('rb') as file:
+                idx.write_bytes(scan_offsets(file.read()).tobytes())
+        self._file: BinaryIO | None = self.path.open('ab')
+        self._index: BinaryIO | None = idx.open('ab')
+        if new_file:
+            self._file.write(FILE_MAGIC)
+        self._offset: int = self._file.tell()
+        self._lock = Lock()
+        # weak, so peers logged through BinarySink without a disconnect hook are not kept either
+        self._connections: weakref.WeakKeyDictionary[Any, int] = weakref.WeakKeyDictionary()
+        self._next_conn_id: int = 1
+        self._deframers: dict[Any, Deframer] = {}
+        self.records: int = 0
+
+    def attach(self, server: SocketServer) -> 'TrafficRecorder':
+        server.received.subscribe(self.on_received)
+        server.transmited.subscribe(self.on_transmited)
+        server.disconnected.subscribe(self.on_disconnected)
+        return self
+
+    def connection_id(self, sock: Any) -> int:
+        conn_id: int | None = self._connections.get(sock)
+        if conn_id is None:
+            with self._lock:
+                conn_id = self._connections.get(sock)
+                if conn_id is None:
+                    conn_id = self._connections[sock] = self._next_conn_id
+                    self._next_conn_id += 1
+        return conn_id
+
+    def on_received(self, data: ReceivedData) -> None:
+        deframer: Deframer | None = self._deframers.get(data.sock)
+        if deframer is None:
+            deframer = self._deframers.setdefault(data.sock, Deframer())
+        conn_id: int = self.connection_id(data.sock)
+        try:
+            for raw_frame in deframer.feed(data.msg):
+                self.record(Direction.RX, conn_id, raw_frame)
+        except DeframeError as err:
+            self.record(Direction.RX, conn_id, err.dropped)  # keep junk as is, it may be what is being debugged
+
+    def on_disconnected(self, data: dict[str, Any]) -> None:
+        for sock in data.values():
+            self._deframers.pop(sock, None)
+            self._connections.pop(sock, None)
+
+    def on_transmited(self, data: bytes) -> None:
+        self.record(Direction.TX, 0, data)
+
+    def record(self, direction: Direction, conn_id: int, data: bytes, timestamp_ns: int | None = None) -> None:
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        header: bytes = RECORD_HEADER.pack(timestamp_ns, conn_id, direction, len(data))
+        with self._lock:
+            if self._file is None or self._index is None:
+                return
+            self._file.write(header)
+            self._file.write(data)
+            self._index.write(INDEX_ENTRY.pack(self._offset))
+            self._offset += len(header) + len(data)
+            self.records += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None and self._index is not None:
+                self._file.flush()
+                self._index.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None and self._index is not None:
+                self._file.close()
+                self._index.close()
+            self._file = None
+            self._index = None
+
+
+class NullSocket:
+    """Stands in for a client socket when frames are replayed straight into API_Gateway.route_frame."""
+    def __init__(self) -> None:
+        self.sent_frames: int = 0
+        self.sent_bytes: int = 0
+
+    def send(self, data: bytes) -> int:
+        self.sent_frames += 1
+        self.sent_bytes += len(data)
+        return len(data)
+
+
+class TrafficReplayer:
+    """Reads a capture file through mmap. The `data` of returned frames are views of the mapping and valid only
+    until `close`; copy them with bytes() to keep them longer."""
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with self.path.open('rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(FILE_MAGIC)] != FILE_MAGIC:
+            raise ValueError(f'{self.path} is not a gateway capture file')
+        self._view = memoryview(self._mmap)
+        self.offsets: array = self._load_index()
+
+    def _load_index(self) -> array:
+        idx: Path = index_path(self.path)
+        if not idx.exists():
+            return scan_offsets(self._mmap)
+        offsets = array('Q')
+        offsets.frombytes(idx.read_bytes()[:idx.stat().st_size // INDEX_ENTRY.size * INDEX_ENTRY.size])
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> CapturedFrame:
+        offset: int = self.offsets[index]
+        timestamp_ns, conn_id, direction, length = RECORD_HEADER.unpack_from(self._mmap, offset)
+        start: int = offset + RECORD_HEADER.size
+        return CapturedFrame(timestamp_ns, conn_id, Direction(direction), self._view[start:start + length])
+
+    def frames(self, direction: Direction | None = Direction.RX) -> Iterator[CapturedFrame]:
+        for index in range(len(self.offsets)):
+            frame: CapturedFrame = self[index]
+            if direction is None or frame.direction == direction:
+                yield frame
+
+    def play(self, sink: Callable[[CapturedFrame], Any], speed: float | None = 1.0,
+             direction: Direction | None = Direction.RX) -> int:
+        """Feeds frames to `sink` with the original timing divided by `speed`, or back to back if speed is None."""
+        sent: int = 0
+        first_ts: int | None = None
+        started: float = time.perf_counter()
+        for frame in self.frames(direction):
+            if speed:
+                if first_ts is None:
+                    first_ts = frame.timestamp_ns
+                delay: float = started + (frame.timestamp_ns - first_ts) / 1e9 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sink(frame)
+            sent += 1
+        return sent
+
+    def replay_to_gateway(self, gateway: Any, speed: float | None = 1.0) -> NullSocket:
+        sock = NullSocket()
+        self.play(lambda frame: gateway.route_frame(bytes(frame.data), sock), speed)
+        return sock
+
+    def replay_to_socket(self, host: str, port: int, speed: float | None = 1.0) -> int:
+        with socket.create_connection((host, port)) as sock:
+            return self.play(lambda frame: sock.sendall(frame.data), speed)
+
+    def close(self) -> None:
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:  # frame views are still alive; the mapping goes away with the last of them
+            logger.warning(f'{self.path}: captured frame views outlive the replayer')
@@ -0,0 +1,232 @@
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+import time
+from typing import Callable
+
+from loguru import logger
+
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.control_command import GatewayCMD
+from kpa_gateway.frame_types.receipt import GatewayReceipt
+from kpa_gateway.utils import filetime_now
+
+
+class CommandFailed(Exception):
+    """The command was answered with a non-zero return code after all retries."""
+    def __init__(self, receipt: GatewayReceipt) -> None:
+        super().__init__(f'Command {receipt.receipt_num} failed with return code {receipt.return_code}')
+        self.receipt: GatewayReceipt = receipt
+
+
+class CommandTimeout(TimeoutError):
+    pass
+
+
+def default_receipt_num(cmd: GatewayCMD) -> int:
+    """The ATS answers a command with a receipt numbered by its cmd_code (WORD)."""
+    return cmd.cmd_code & 0xFFFF
+
+
+class PendingCommand:
+    __slots__ = ('frame', 'receipt_num', 'future', 'timeout', 'retries', 'attempts', 'sent', 'deadline')
+
+    def __init__(self, frame: GatewayFrame, receipt_num: int, timeout: float, retries: int) -> None:
+        self.frame: GatewayFrame = frame
+        self.receipt_num: int = receipt_num
+        self.future: Future[GatewayReceipt] = Future()
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.attempts: int = 0
+        self.sent: float = 0
+        self.deadline: float = 0
+
+
+class CommandTracker:
+    """Sends commands with up to `window` of them awaiting receipts and resolves them from incoming receipts.
+
+    `submit` returns a `concurrent.futures.Future` with the receipt (`asyncio.wrap_future` makes it awaitable).
+    Commands beyond the window wait in submission order. A NACK (non-zero return code) or no receipt within
+    `timeout` resends the command up to `retries` times, then the future fails with CommandFailed or
+    CommandTimeout. Receipts carry no sequence number, so several in-flight commands with the same receipt number
+    are matched first in, first out.
+    """
+    def __init__(self, send: Callable[[GatewayFrame], int], window: int = 8, timeout: float = 1.0,
+                 retries: int = 2, receipt_num: Callable[[GatewayCMD], int] = default_receipt_num) -> None:
+        self.send: Callable[[GatewayFrame], int] = send
+        self.window: int = window
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.receipt_num: Callable[[GatewayCMD], int] = receipt_num
+        self._in_flight: dict[int, deque[PendingCommand]] = {}
+        self._queued: deque[PendingCommand] = deque()
+        self._cond = Condition()
+        self._closed: bool = False
+        self.in_flight: int = 0
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.nacks: int = 0
+        self.timeouts: int = 0
+        self.resent: int = 0
+        self.failed: int = 0
+        self.unexpected: int = 0
+        self.last_rtt: float = 0
+        self._thread = Thread(name='command_tracker', daemon=True, target=self._routine)
+        self._thread.start()
+
+    def submit(self, frame: GatewayFrame | GatewayCMD, timeout: float | None = None,
+               retries: int | None = None) -> 'Future[GatewayReceipt]':
+        if isinstance(frame, GatewayCMD):
+            frame = GatewayFrame(frame)
+        command = PendingCommand(frame, self.receipt_num(frame.frame),  # type: ignore
+                                 self.timeout if timeout is None else timeout,
+                                 self.retries if retries is None else retries)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('CommandTracker is closed')
+            self.submitted += 1
+            self._queued.append(command)
+            failed: list[PendingCommand] = self._fill_window()
+        self._fail_unsent(failed)
+        return command.future
+
+    def _fill_window(self) -> list[PendingCommand]:
+        """Sends queued commands while the window has room; called with the lock held."""
+        failed: list[PendingCommand] = []
+        while self._queued and self.in_flight < self.window:
+            command: PendingCommand = self._queued.popleft()
+            if command.future.cancelled():
+                continue
+            if not self._send(command):
+                failed.append(command)
+                continue
+            self._in_flight.setdefault(command.receipt_num, deque()).append(command)
+            self.in_flight += 1
+        if failed:
+            self.failed += len(failed)
+        self._cond.notify()
+        return failed
+
+    def _send(self, command: PendingCommand) -> bool:
+        if command.attempts:
+            command.frame.filetime = filetime_now()
+            self.resent += 1
+        command.attempts += 1
+        command.sent = time.monotonic()
+        command.deadline = command.sent + command.timeout
+        return self.send(command.frame) > 0
+
+    @staticmethod
+    def _fail_unsent(commands: list[PendingCommand]) -> None:
+        for command in commands:
+            command.future.set_exception(ConnectionError('No client to send the command to'))
+
+    def _take(self, command: PendingCommand) -> None:
+        pending: deque[PendingCommand] = self._in_flight[command.receipt_num]
+        pending.remove(command)
+        if not pending:
+            del self._in_flight[command.receipt_num]
+        self.in_flight -= 1
+
+    def on_receipt(self, receipt: GatewayReceipt) -> bool:
+        """Completes the oldest in-flight command with the receipt's number; False if there is none."""
+        result: GatewayReceipt | Exception | None = None
+        with self._cond:
+            pending: deque[PendingCommand] | None = self._in_flight.get(receipt.receipt_num)
+            if not pending:
+                self.unexpected += 1
+                return False
+            command: PendingCommand = pending[0]
+            if receipt.return_code:
+                self.nacks += 1
+                if command.attempts <= command.retries:
+                    pending.rotate(-1)  # the resent command now waits behind the others with its number
+                    if self._send(command):
+                        return True
+                self._take(command)
+                self.failed += 1
+                result = CommandFailed(receipt)
+            else:
+                self._take(command)
+                self.completed += 1
+                self.last_rtt = time.monotonic() - command.sent
+                result = receipt
+            failed: list[PendingCommand] = self._fill_window()
+        self._resolve(command, result)
+        self._fail_unsent(failed)
+        return True
+
+    @staticmethod
+    def _resolve(command: PendingCommand, result: GatewayReceipt | Exception) -> None:
+        if command.future.cancelled():
+            return
+        if isinstance(result, Exception):
+            command.future.set_exception(result)
+        else:
+            command.future.set_result(result)
+
+    def _expire(self, now: float) -> tuple[list[PendingCommand], float | None]:
+        """Resends or fails commands past their deadline; returns the failed ones and the nearest deadline."""
+        expired: list[PendingCommand] = []
+        nearest: float | None = None
+        for pending in list(self._in_flight.values()):
+            for command in list(pending):
+                if command.deadline > now:
+                    nearest = command.deadline if nearest is None else min(nearest, command.deadline)
+                    continue
+                self.timeouts += 1
+                if command.attempts <= command.retries and not command.future.cancelled():
+                    pending.remove(command)
+                    pending.append(command)
+                    if self._send(command):
+                        nearest = command.deadline if nearest is None else min(nearest, command.deadline)
+                        continue
+                self._take(command)
+                self.failed += 1
+                expired.append(command)
+        return expired, nearest
+
+    def _routine(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    expired, nearest = self._expire(time.monotonic())
+                    if expired:
+                        failed: list[PendingCommand] = self._fill_window()
+                        break
+                    self._cond.wait(None if nearest is None else nearest - time.monotonic())
+            for command in expired:
+                self._resolve(command, CommandTimeout(f'No receipt {command.receipt_num} after '
+                                                      f'{command.attempts} attempts'))
+            self._fail_unsent(failed)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'in_flight': self.in_flight,
+            'queued': len(self._queued),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'nacks': self.nacks,
+            'timeouts': self.timeouts,
+            'resent': self.resent,
+            'failed': self.failed,
+            'unexpected_receipts': self.unexpected,
+            'last_rtt_sec': self.last_rtt,
+        }
+
+    def close(self) -> None:
+        """Cancels every queued and in-flight command."""
+        with self._cond:
+            self._closed = True
+            commands: list[PendingCommand] = [*self._queued]
+            for pending in self._in_flight.values():
+                commands.extend(pending)
+            self._queued.clear()
+            self._in_flight.clear()
+            self.in_flight = 0
+            self._cond.notify()
+        for command in commands:
+            command.future.cancel()
+        logger.debug(f'command tracker closed, {len(commands)} commands cancelled')
@@ -0,0 +1,50 @@
+import struct
+from typing import Iterator
+
+
+LENGTH_FIELD_SIZE = 2
+MIN_FRAME_LENGTH = 10  # timestamp (8) + frame_id (2)
+
+
+class DeframeError(ValueError):
+    """Raised for an impossible frame_length; `dropped` holds the buffered bytes that were discarded."""
+    def __init__(self, message: str, dropped: bytes) -> None:
+        super().__init__(message)
+        self.dropped: bytes = dropped
+
+
+class Deframer:
+    """Incremental splitter of a TCP byte stream into whole gateway frames.
+
+    Each frame starts with a `<H` frame_length field which counts every byte after itself, so a frame occupies
+    frame_length + 2 bytes on the wire. One instance must be used per connection.
+    """
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        self._buffer += chunk
+        return iter(self)
+
+    def reset(self) -> None:
+        self._buffer.clear()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def __iter__(self) -> Iterator[bytes]:
+        buffer: bytearray = self._buffer
+        while len(buffer) >= LENGTH_FIELD_SIZE:
+            frame_length: int = struct.unpack_from('<H', buffer)[0]
+            if frame_length < MIN_FRAME_LENGTH:
+                dropped: bytes = bytes(buffer)
+                buffer.clear()
+                raise DeframeError(f'Incorrect frame length {frame_length}. Dropped {len(dropped)} buffered bytes',
+                                   dropped)
+            end: int = frame_length + LENGTH_FIELD_SIZE
+            if len(buffer) < end:
+                return
+            frame = bytes(buffer[:end])
+            del buffer[:end]
+            yield frame
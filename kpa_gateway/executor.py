@@ -0,0 +1,112 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Hashable
+
+
+class KeyedExecutor:
+    """Thread pool which runs tasks with the same key one after another in submission order.
+
+    Tasks of different keys run in parallel on up to `max_workers` threads. A key runs at most `batch` tasks per
+    turn and then goes back to the end of the pool queue, so a busy key cannot hold a thread while other keys wait.
+    At most `max_pending` tasks may wait or run at once; `submit` blocks the caller (the socket thread) when the
+    limit is reached.
+    """
+    def __init__(self, max_workers: int = 4, max_pending: int = 1024, name: str = 'handler', batch: int = 4) -> None:
+        self.max_workers: int = max_workers
+        self.max_pending: int = max_pending
+        self.batch: int = max(1, batch)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._queues: dict[Hashable, deque[tuple[Future, Callable, tuple]]] = {}
+        self._lock = Lock()
+        self._slots = BoundedSemaphore(max_pending)
+        self._pending: int = 0
+        self._running: int = 0
+        self.max_pending_seen: int = 0
+        self.blocked_submits: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+
+    def submit(self, key: Hashable, func: Callable, *args: Any) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.blocked_submits += 1
+            self._slots.acquire()
+        return self._enqueue(key, func, args)
+
+    def try_submit(self, key: Hashable, func: Callable, *args: Any) -> Future | None:
+        if not self._slots.acquire(blocking=False):
+            return None
+        return self._enqueue(key, func, args)
+
+    def _enqueue(self, key: Hashable, func: Callable, args: tuple) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self._pending)
+            queue: deque | None = self._queues.get(key)
+            if queue is not None:
+                queue.append((future, func, args))
+                return future
+            self._queues[key] = deque([(future, func, args)])
+        self._pool.submit(self._drain, key)
+        return future
+
+    def _drain(self, key: Hashable) -> None:
+        while self._run_batch(key):
+            try:
+                self._pool.submit(self._drain, key)  # requeue behind the other keys
+                return
+            except RuntimeError:  # the pool is shutting down, finish the key on this thread
+                continue
+
+    def _run_batch(self, key: Hashable) -> bool:
+        """Runs up to `batch` tasks of the key; returns True when the key has more queued."""
+        with self._lock:
+            self._running += 1
+        try:
+            for _ in range(self.batch):
+                with self._lock:
+                    queue: deque = self._queues[key]
+                    if not queue:
+                        del self._queues[key]
+                        return False
+                    future, func, args = queue.popleft()
+                failed: bool = False
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(*args))
+                    except BaseException as err:
+                        future.set_exception(err)
+                        failed = True
+                with self._lock:
+                    self._pending -= 1
+                    self.failed += failed
+                    self.completed += not failed
+                self._slots.release()
+            with self._lock:
+                if self._queues[key]:
+                    return True
+                del self._queues[key]
+                return False
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'busy_workers': self._running,
+                'saturation': self._running / self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'max_pending_seen': self.max_pending_seen,
+                'active_keys': len(self._queues),
+                'blocked_submits': self.blocked_submits,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,207 @@
+from collections import deque
+from enum import Enum
+from threading import Condition, Lock, Thread
+import time
+from typing import Callable, Hashable, Iterable, NamedTuple
+
+from loguru import logger
+
+from kpa_gateway.frame_types.base_types import FrameID
+
+
+TELEMETRY_FRAME_IDS: tuple[FrameID, ...] = (FrameID.POSITION_TELEMETRY, FrameID.ADDRESS_TELEMETRY)
+
+
+class OverflowPolicy(Enum):
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    CONFLATE = 'conflate'  # keep only the latest pending frame per (frame_id, telemetry_type)
+    DISCONNECT = 'disconnect'
+
+
+class TelemetryItem(NamedTuple):
+    published: float  # time.monotonic() at publish
+    frame_id: int
+    telemetry_type: int | None
+    data: bytes
+
+
+class Subscription:
+    """One consumer of published frames with its own bounded queue and delivery thread.
+
+    `offer` never blocks the publisher; what happens when the queue is full is decided by `policy`. The delivery
+    thread calls `callback(data)` with the encoded frame, so a slow callback only delays this subscriber.
+    """
+    def __init__(self, name: str, callback: Callable[[bytes], None],
+                 frame_ids: Iterable[FrameID] = TELEMETRY_FRAME_IDS, telemetry_types: Iterable[int] | None = None, *,
+                 max_queue: int = 1024, policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 on_disconnect: Callable[['Subscription'], None] | None = None) -> None:
+        self.name: str = name
+        self.callback: Callable[[bytes], None] = callback
+        self.frame_ids: frozenset[int] = frozenset(frame_id.value for frame_id in frame_ids)
+        self.telemetry_types: frozenset[int] | None = frozenset(telemetry_types) if telemetry_types else None
+        self.max_queue: int = max_queue
+        self.policy: OverflowPolicy = policy
+        self.on_disconnect: Callable[['Subscription'], None] | None = on_disconnect
+        self._queue: deque[TelemetryItem] = deque()
+        self._latest: dict[Hashable, TelemetryItem] = {}  # CONFLATE only, with _keys in arrival order
+        self._keys: deque[Hashable] = deque()
+        self._cond = Condition()
+        self.closed: bool = False
+        self.disconnected: bool = False
+        self.offered: int = 0
+        self.delivered: int = 0
+        self.dropped: int = 0
+        self.conflated: int = 0
+        self.failed: int = 0
+        self.max_depth: int = 0
+        self.last_lag: float = 0
+        self.max_lag: float = 0
+        self._thread = Thread(name=f'subscriber_{name}', daemon=True, target=self._routine)
+        self._thread.start()
+
+    def accepts(self, frame_id: int, telemetry_type: int | None) -> bool:
+        if frame_id not in self.frame_ids:
+            return False
+        return self.telemetry_types is None or telemetry_type in self.telemetry_types
+
+    @property
+    def depth(self) -> int:
+        return len(self._keys) if self.policy == OverflowPolicy.CONFLATE else len(self._queue)
+
+    def oldest_age(self) -> float:
+        """Seconds the oldest pending frame has been waiting, i.e. how far the subscriber lags behind."""
+        with self._cond:
+            if self.policy == OverflowPolicy.CONFLATE:
+                oldest: TelemetryItem | None = self._latest[self._keys[0]] if self._keys else None
+            else:
+                oldest = self._queue[0] if self._queue else None
+        return time.monotonic() - oldest.published if oldest else 0
+
+    def offer(self, item: TelemetryItem) -> bool:
+        disconnect: bool = False
+        with self._cond:
+            if self.closed:
+                return False
+            self.offered += 1
+            if self.policy == OverflowPolicy.CONFLATE:
+                key: Hashable = (item.frame_id, item.telemetry_type)
+                if key in self._latest:
+                    self._latest[key] = item
+                    self.conflated += 1
+                    return True
+                if len(self._keys) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+                self._latest[key] = item
+                self._keys.append(key)
+            elif len(self._queue) >= self.max_queue:
+                if self.policy == OverflowPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == OverflowPolicy.DISCONNECT:
+                    self.dropped += len(self._queue) + 1
+                    self._queue.clear()
+                    self.closed = self.disconnected = disconnect = True
+                else:
+                    self._queue.popleft()
+                    self.dropped += 1
+                    self._queue.append(item)
+            else:
+                self._queue.append(item)
+            self.max_depth = max(self.max_depth, self.depth)
+            self._cond.notify()
+        if disconnect:
+            logger.warning(f'subscriber {self.name} disconnected: queue overflow ({self.max_queue} frames)')
+            if self.on_disconnect:
+                self.on_disconnect(self)
+            return False
+        return True
+
+    def _next(self) -> TelemetryItem | None:
+        with self._cond:
+            while not self._queue and not self._keys and not self.closed:
+                self._cond.wait()
+            if self.closed:
+                return None
+            if self.policy == OverflowPolicy.CONFLATE:
+                return self._latest.pop(self._keys.popleft())
+            return self._queue.popleft()
+
+    def _routine(self) -> None:
+        while (item := self._next()) is not None:
+            try:
+                self.callback(item.data)
+                self.delivered += 1
+            except Exception as err:
+                self.failed += 1
+                logger.error(f'subscriber {self.name}: {err}')
+            self.last_lag = time.monotonic() - item.published
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def stats(self) -> dict[str, int | float | str]:
+        return {
+            'policy': self.policy.value,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'lag_sec': self.oldest_age(),
+            'last_lag_sec': self.last_lag,
+            'max_lag_sec': self.max_lag,
+            'offered': self.offered,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'failed': self.failed,
+        }
+
+
+class FanOut:
+    """Publishes encoded frames to all matching subscriptions.
+
+    The subscription list is replaced, not mutated, so `publish` iterates it without taking a lock. `on_remove` is
+    called once for every subscription that is removed, whether unsubscribed, disconnected or closed.
+    """
+    def __init__(self, on_remove: Callable[[Subscription], None] | None = None) -> None:
+        self.subscriptions: tuple[Subscription, ...] = ()
+        self.on_remove: Callable[[Subscription], None] | None = on_remove
+        self._lock = Lock()
+
+    def add(self, subscription: Subscription) -> Subscription:
+        with self._lock:
+            self.subscriptions = (*self.subscriptions, subscription)
+        return subscription
+
+    def remove(self, subscription: Subscription) -> None:
+        subscription.close()
+        with self._lock:
+            remaining: tuple[Subscription, ...] = tuple(sub for sub in self.subscriptions if sub is not subscription)
+            removed: bool = len(remaining) != len(self.subscriptions)
+            self.subscriptions = remaining
+        if removed and self.on_remove:
+            self.on_remove(subscription)
+
+    def publish(self, frame_id: int, telemetry_type: int | None, data: bytes) -> int:
+        item: TelemetryItem | None = None
+        accepted: int = 0
+        for subscription in self.subscriptions:
+            if not subscription.accepts(frame_id, telemetry_type):
+                continue
+            if item is None:
+                item = TelemetryItem(time.monotonic(), frame_id, telemetry_type, data)
+            if subscription.offer(item):
+                accepted += 1
+            elif subscription.disconnected:
+                self.remove(subscription)
+        return accepted
+
+    def stats(self) -> dict[str, dict[str, int | float | str]]:
+        return {sub.name: sub.stats() for sub in self.subscriptions}
+
+    def close(self) -> None:
+        for subscription in self.subscriptions:
+            self.remove(subscription)
@@ -0,0 +1,265 @@
+from collections import deque
+import json
+from pathlib import Path
+from threading import Event, Thread
+import time
+from typing import Any, Callable, NamedTuple, Protocol, TextIO
+from weakref import WeakKeyDictionary
+
+from loguru import logger
+
+from kpa_gateway.capture import TrafficRecorder
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.base_types import FrameID
+from kpa_gateway.utils import Direction, TokenBucket
+
+
+DROP_WARNING_SEC = 5.0
+
+
+class FrameRecord(NamedTuple):
+    timestamp_ns: int  # time.monotonic_ns() when the frame was logged
+    direction: Direction
+    frame_id: int
+    level: str
+    data: bytes
+    peer: Any  # client socket/connection, None for frames sent by the gateway
+
+
+class FrameSink(Protocol):
+    def write(self, record: FrameRecord) -> None: ...
+
+    def flush(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def describe_frame(data: bytes) -> str:
+    try:
+        return str(GatewayFrame.parse(data))
+    except ValueError as err:
+        return f'Malformed frame ({err}): 0x{data.hex(" ").upper()}'
+
+
+class LoguruSink:
+    """Full multi-line frame description through loguru; formatting is skipped when loguru drops the level."""
+    def write(self, record: FrameRecord) -> None:
+        logger.opt(lazy=True).log(record.level, '{}', lambda: describe_frame(record.data))
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def _frame_name(frame_id: int) -> str:
+    try:
+        return FrameID(frame_id).name
+    except ValueError:
+        return str(frame_id)
+
+
+class JsonLinesSink:
+    """One compact JSON object per frame: wall clock time, direction, FrameID, connection, length and hex data."""
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._file: TextIO = self.path.open('a', encoding='utf-8')
+        self._wall_offset_ns: int = time.time_ns() - time.monotonic_ns()
+        self._connections: WeakKeyDictionary[Any, int] = WeakKeyDictionary()  # closed sockets drop out
+        self._last_conn_id: int = 0
+
+    def _connection_id(self, peer: Any) -> int:
+        conn_id: int | None = self._connections.get(peer)
+        if conn_id is None:
+            self._last_conn_id += 1
+            conn_id = self._connections[peer] = self._last_conn_id
+        return conn_id
+
+    def write(self, record: FrameRecord) -> None:
+        conn_id: int = 0 if record.peer is None else self._connection_id(record.peer)
+        self._file.write(json.dumps({
+            'ts': (record.timestamp_ns + self._wall_offset_ns) / 1e9,
+            'dir': record.direction.name.lower(),
+            'frame_id': _frame_name(record.frame_id),
+            'conn': conn_id,
+            'len': len(record.data),
+            'data': record.data.hex(),
+        }, separators=(',', ':')))
+        self._file.write('\n')
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BinarySink:
+    """Writes the capture file format, so logged frames can be read back with TrafficReplayer."""
+    def __init__(self, path: str | Path) -> None:
+        self.recorder = TrafficRecorder(path)
+
+    def write(self, record: FrameRecord) -> None:
+        conn_id: int = 0 if record.peer is None else self.recorder.connection_id(record.peer)
+        self.recorder.record(record.direction, conn_id, record.data, record.timestamp_ns)
+
+    def flush(self) -> None:
+        self.recorder.flush()
+
+    def close(self) -> None:
+        self.recorder.close()
+
+
+class FrameLogger:
+    """Frame logging stage between the socket threads and the log sinks.
+
+    `log` does only cheap checks on the calling thread: the level of the frame type against the minimum level,
+    1-in-N sampling and a token bucket rate limit. Accepted frames go into a bounded queue as raw bytes; a background
+    thread formats and writes them in batches. Records are accepted only between `start` and `stop`; when the queue
+    is full or the logger is stopped they are dropped, counted and reported with a warning at most every
+    `DROP_WARNING_SEC`. `stop` keeps the sinks open for another `start`, `close` closes them.
+    """
+    def __init__(self, sinks: list[FrameSink] | None = None, *, min_level: str = 'INFO', default_level: str = 'INFO',
+                 levels: dict[FrameID, str] | None = None, sample_every: dict[FrameID, int] | None = None,
+                 rate_limits: dict[FrameID, float] | None = None, queue_size: int = 10000,
+                 flush_interval: float = 0.05) -> None:
+        self.sinks: list[FrameSink] = sinks if sinks is not None else [LoguruSink()]
+        self.enabled: bool = True
+        self.queue_size: int = queue_size
+        self.flush_interval: float = flush_interval
+        self._default_level: tuple[str, int] = (default_level, logger.level(default_level).no)
+        self._min_level_no: int = logger.level(min_level).no
+        self._levels: dict[int, tuple[str, int]] = {}
+        self._sample_every: dict[int, int] = {}
+        self._sample_counters: dict[int, int] = {}
+        self._rate_limits: dict[int, TokenBucket] = {}
+        for frame_id, level in (levels or {}).items():
+            self.set_level(frame_id, level)
+        for frame_id, every in (sample_every or {}).items():
+            self.set_sampling(frame_id, every)
+        for frame_id, rate in (rate_limits or {}).items():
+            self.set_rate_limit(frame_id, rate)
+        self._queue: deque[FrameRecord] = deque()
+        self._stop_event = Event()
+        self._thread: Thread | None = None
+        self._accepting: bool = False
+        self._drop_warned: float = 0
+        self.logged: int = 0
+        self.filtered: int = 0
+        self.sampled_out: int = 0
+        self.rate_limited: int = 0
+        self.dropped: int = 0
+
+    def set_min_level(self, level: str) -> None:
+        self._min_level_no = logger.level(level).no
+
+    def set_default_level(self, level: str) -> None:
+        self._default_level = (level, logger.level(level).no)
+
+    def set_level(self, frame_id: FrameID, level: str) -> None:
+        self._levels[frame_id.value] = (level, logger.level(level).no)
+
+    def set_sampling(self, frame_id: FrameID, every: int) -> None:
+        """Log only every `every`-th frame of this type; 1 logs all of them."""
+        self._sample_every[frame_id.value] = max(1, every)
+        self._sample_counters[frame_id.value] = 0
+
+    def set_rate_limit(self, frame_id: FrameID, frames_per_sec: float | None) -> None:
+        if frames_per_sec is None:
+            self._rate_limits.pop(frame_id.value, None)
+        else:
+            self._rate_limits[frame_id.value] = TokenBucket(frames_per_sec)
+
+    def log(self, direction: Direction, frame_id: int, data: bytes, peer: Any = None) -> bool:
+        if not self.enabled:
+            return False
+        level, level_no = self._levels.get(frame_id, self._default_level)
+        if level_no < self._min_level_no:
+            self.filtered += 1
+            return False
+        if not self._throttle(frame_id):
+            return False
+        if not self._accepting or len(self._queue) >= self.queue_size:
+            self._drop('the frame log queue is full' if self._accepting else 'the frame logger is not started')
+            return False
+        self._queue.append(FrameRecord(time.monotonic_ns(), direction, frame_id, level, data, peer))
+        return True
+
+    def _throttle(self, frame_id: int) -> bool:
+        """Applies 1-in-N sampling and the rate limit of the frame type; returns False for a skipped frame."""
+        every: int | None = self._sample_every.get(frame_id)
+        if every is not None and every > 1:
+            counter: int = self._sample_counters[frame_id]
+            self._sample_counters[frame_id] = counter + 1
+            if counter % every:
+                self.sampled_out += 1
+                return False
+        bucket: TokenBucket | None = self._rate_limits.get(frame_id)
+        if bucket is not None and not bucket.take():
+            self.rate_limited += 1
+            return False
+        return True
+
+    def _drop(self, reason: str) -> None:
+        self.dropped += 1
+        now: float = time.monotonic()
+        if now - self._drop_warned >= DROP_WARNING_SEC:
+            self._drop_warned = now
+            logger.warning(f'{reason}, frame records dropped: {self.dropped}')
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queued': len(self._queue),
+            'logged': self.logged,
+            'filtered': self.filtered,
+            'sampled_out': self.sampled_out,
+            'rate_limited': self.rate_limited,
+            'dropped': self.dropped,
+        }
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = Thread(name='frame_log', daemon=True, target=self._routine)
+            self._thread.start()
+        self._accepting = True
+
+    def stop(self) -> None:
+        """Stops the writer thread after writing the queued records; the sinks stay open."""
+        self._accepting = False
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(1)
+            self._thread = None
+        self._drain()
+
+    def close(self) -> None:
+        self.stop()
+        for sink in self.sinks:
+            self._call(sink.close)
+
+    def _drain(self) -> int:
+        written: int = 0
+        while self._queue:
+            record: FrameRecord = self._queue.popleft()
+            for sink in self.sinks:
+                self._call(sink.write, record)
+            written += 1
+        if written:
+            for sink in self.sinks:
+                self._call(sink.flush)
+            self.logged += written
+        return written
+
+    @staticmethod
+    def _call(func: Callable, *args: Any) -> None:
+        try:
+            func(*args)
+        except Exception as err:
+            logger.exception(err)
+
+    def _routine(self) -> None:
+        while not self._stop_event.is_set():
+            if not self._drain():
+                self._stop_event.wait(self.flush_interval)
@@ -1,13 +1,13 @@
 from datetime import datetime
-from typing import Union
+from typing import NamedTuple, Union
 import struct
 from kpa_gateway.frame_types.address_telemetry import GatewayAddrTel
-from kpa_gateway.frame_types.base_types import FrameCMDArgType, FrameID
+from kpa_gateway.frame_types.base_types import FrameCMDArgType, FrameID, as_buffer
 from kpa_gateway.frame_types.control_command import GatewayCMD
 from kpa_gateway.frame_types.message import GatewayLogMessage, GatewayMessage
 from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
 from kpa_gateway.frame_types.receipt import GatewayReceipt
-from kpa_gateway.utils import dt_to_filetime, filetime_to_dt
+from kpa_gateway.utils import dt_to_filetime, filetime_now, filetime_to_dt
 
 
 FRAME_TYPES = Union[
@@ -19,36 +19,124 @@ FRAME_TYPES = Union[
     GatewayCMD
 ]
 
+FRAME_HANDLERS: dict[int, type[FRAME_TYPES]] = {
+    FrameID.RECEIPT.value: GatewayReceipt,
+    FrameID.CMD.value: GatewayCMD,
+    FrameID.ADDRESS_TELEMETRY.value: GatewayAddrTel,
+    FrameID.POSITION_TELEMETRY.value: GatewayPosTel,
+    FrameID.MESSAGE.value: GatewayMessage,
+    FrameID.LOG_MESSAGE.value: GatewayLogMessage
+}
+HEADER = struct.Struct('<HQH')
+PREFIX = struct.Struct('<HQ')  # frame_length, filetime in front of the encoded frame
+CMD_ROUTE = struct.Struct('<HI')  # cmd_type, cmd_code right after the header
+POS_TEL_ROUTE = struct.Struct('<H')  # telemetry_type right after the header
+
+
+class FrameHeader(NamedTuple):
+    frame_length: int
+    filetime: int
+    frame_id: int
+    cmd_type: int | None = None
+    cmd_code: int | None = None
+    telemetry_type: int | None = None
+
 
 class GatewayFrame:
-    def __init__(self, frame: FRAME_TYPES, timestamp: datetime | None = None):
+    __slots__ = ('frame', 'filetime', '_dt', '_raw', '_frame_rev')
+
+    def __init__(self, frame: FRAME_TYPES, timestamp: datetime | None = None, filetime: int | None = None):
         self.frame = frame
-        self.timestamp: datetime = timestamp if timestamp else datetime.now()
-        self.frame_length: int = len(frame.to_bytes()) + 8
+        if filetime is None:
+            filetime = dt_to_filetime(timestamp) if timestamp else filetime_now()
+        self.filetime: int = filetime
+        self._dt: tuple[int, datetime] | None = (filetime, timestamp) if timestamp else None
+        self._raw: bytes | memoryview | None = None
+        self._frame_rev: int = -1
+
+    def __setattr__(self, name: str, value) -> None:
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            object.__setattr__(self, '_raw', None)
+
+    @property
+    def timestamp(self) -> datetime:
+        """`filetime` as a naive datetime, built on first access."""
+        cached: tuple[int, datetime] | None = self._dt
+        if cached is None or cached[0] != self.filetime:
+            cached = self._dt = (self.filetime, filetime_to_dt(self.filetime))
+        return cached[1]
+
+    @timestamp.setter
+    def timestamp(self, value: datetime) -> None:
+        filetime: int = dt_to_filetime(value)
+        self._dt = (filetime, value)
+        self.filetime = filetime
+
+    @property
+    def frame_length(self) -> int:
+        return self.frame.wire_size() + 8
+
+    @staticmethod
+    def peek(buffer: bytes | memoryview, offset: int = 0) -> FrameHeader:
+        try:
+            frame_length, filetime, frame_id = HEADER.unpack_from(buffer, offset)
+            if frame_id == FrameID.CMD.value:
+                return FrameHeader(frame_length, filetime, frame_id, *CMD_ROUTE.unpack_from(buffer, offset + 12))
+            if frame_id == FrameID.POSITION_TELEMETRY.value:
+                telemetry_type: int = POS_TEL_ROUTE.unpack_from(buffer, offset + 12)[0]
+                return FrameHeader(frame_length, filetime, frame_id, telemetry_type=telemetry_type)
+        except struct.error as err:
+            raise ValueError(f'Incorrect base frame header: {err}') from err
+        return FrameHeader(frame_length, filetime, frame_id)
+
+    @staticmethod
+    def parse(data: bytes, lazy: bool = False) -> 'GatewayFrame':
+        return GatewayFrame.parse_from(as_buffer(data), 0, lazy)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayFrame':
-        header_fields = struct.unpack('<HQH', data[:12])
-        handlers: dict = {
-            FrameID.RECEIPT.value: GatewayReceipt,
-            FrameID.CMD.value: GatewayCMD,
-            FrameID.ADDRESS_TELEMETRY.value: GatewayAddrTel,
-            FrameID.POSITION_TELEMETRY.value: GatewayPosTel,
-            FrameID.MESSAGE.value: GatewayMessage,
-            FrameID.LOG_MESSAGE.value: GatewayLogMessage
-        }
-        parameters: bytes = data[12:]
-        frame_length: int = header_fields[0]
-        timestamp: datetime = filetime_to_dt(header_fields[1])
-        frame_id: FrameID = FrameID(header_fields[2])
-        frame: FRAME_TYPES = handlers[frame_id.value].parse(parameters)
-        got_len: int = len(frame.to_bytes()) + 8
-        if frame_length != got_len:
-            raise ValueError(f'Incorrect base frame length. Got {got_len} but should be {frame_length}')
-        return GatewayFrame(frame, timestamp)
+    def parse_from(buffer: memoryview, offset: int = 0, lazy: bool = False) -> 'GatewayFrame':
+        try:
+            frame_length, filetime, frame_id = HEADER.unpack_from(buffer, offset)
+        except struct.error as err:
+            raise ValueError(f'Incorrect base frame header: {err}') from err
+        end: int = offset + frame_length + 2
+        if end > len(buffer):
+            raise ValueError(f'Incorrect base frame length. Got {len(buffer) - offset - 2} but should be '
+                             f'{frame_length}')
+        handler: type[FRAME_TYPES] | None = FRAME_HANDLERS.get(frame_id)
+        if handler is None:
+            raise ValueError(f'{frame_id} is not a valid FrameID')
+        if not isinstance(buffer.obj, bytes):  # the frame keeps views, so it must not pin a buffer the caller reuses
+            buffer, offset, end = memoryview(buffer[offset:end].tobytes()), 0, end - offset
+        try:
+            if lazy and handler is GatewayCMD:
+                frame: FRAME_TYPES = GatewayCMD.parse_from(buffer, offset + 12, end, lazy=True)
+            else:
+                frame = handler.parse_from(buffer, offset + 12, end)
+        except struct.error as err:
+            raise ValueError(f'Incorrect {handler.frame_id.name} frame: {err}') from err
+        if not lazy or handler is not GatewayCMD:  # lazy arguments are checked when they are decoded
+            got_len: int = frame._calc_size() + 8
+            if got_len != frame_length:
+                raise ValueError(f'Incorrect base frame length. Got {got_len} but should be {frame_length}')
+        frame._raw = buffer[offset + 10:end]
+        transport_frame = GatewayFrame(frame, filetime=filetime)
+        whole: bool = not offset and end == len(buffer) and isinstance(buffer.obj, bytes)
+        transport_frame._raw = buffer.obj if whole else buffer[offset:end]  # type: ignore
+        transport_frame._frame_rev = frame._rev
+        return transport_frame
 
     def to_bytes(self) -> bytes:
-        return struct.pack('<HQ', self.frame_length, dt_to_filetime(self.timestamp)) + self.frame.to_bytes()
+        raw: bytes | memoryview | None = self._raw
+        if raw is None or self._frame_rev != self.frame._rev or not self.frame._cacheable():
+            body: bytes = self.frame.to_bytes()
+            raw = PREFIX.pack(len(body) + 8, self.filetime) + body
+            self._frame_rev = self.frame._rev
+        elif not isinstance(raw, bytes):
+            raw = bytes(raw)
+        self._raw = raw
+        return raw
 
     def __str__(self) -> str:
         split_line = '=' * 30
@@ -0,0 +1,83 @@
+import struct
+from typing import Any, Hashable, Iterable
+
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.address_telemetry import AddrTelParameter, GatewayAddrTel
+from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
+from kpa_gateway.utils import filetime_now
+
+
+FILETIME = struct.Struct('<Q')
+FILETIME_OFFSET = 2  # right after frame_length
+FRAME_BODY = 12  # frame_length, filetime, frame_id
+POS_TEL_DATA = 16  # frame_length, filetime, frame_id, telemetry_type, size
+ADDR_TEL_RECORDS = 14  # frame_length, filetime, frame_id, arg_amount
+ADDR_TEL_RECORD_HEADER = 5  # telemetry_type, arg_num, arg_size
+
+
+class FrameTemplate:
+    """A gateway frame encoded once into a bytearray whose named fields are patched in place.
+
+    Each field is a struct format at a fixed offset of the encoded frame. `render` stamps the FILETIME and returns
+    a copy of the buffer, so a frame still queued for sending is never changed by the next tick.
+    """
+    def __init__(self, frame: GatewayFrame) -> None:
+        self.frame_id: int = frame.frame.frame_id.value
+        self.telemetry_type: int | None = None  # for subscription filters, as in API_Gateway.send_to
+        if isinstance(frame.frame, GatewayPosTel):
+            self.telemetry_type = frame.frame.telemetry_type
+        elif isinstance(frame.frame, GatewayAddrTel) and frame.frame.args:
+            self.telemetry_type = frame.frame.args[0].telemetry_type
+        self.buffer = bytearray(frame.to_bytes())
+        self.fields: dict[Hashable, tuple[int, struct.Struct]] = {}
+
+    def add_field(self, name: Hashable, offset: int, fmt: str) -> 'FrameTemplate':
+        codec = struct.Struct(fmt)
+        if offset < FRAME_BODY or offset + codec.size > len(self.buffer):
+            raise ValueError(f'Field {name} ({fmt} at {offset}) is outside of the frame body')
+        self.fields[name] = (offset, codec)
+        return self
+
+    def set(self, name: Hashable, *values: Any) -> None:
+        offset, codec = self.fields[name]
+        codec.pack_into(self.buffer, offset, *values)
+
+    def update(self, values: dict[Hashable, Any]) -> None:
+        buffer: bytearray = self.buffer
+        fields: dict[Hashable, tuple[int, struct.Struct]] = self.fields
+        for name, value in values.items():
+            offset, codec = fields[name]
+            codec.pack_into(buffer, offset, value)
+
+    def render(self, filetime: int | None = None) -> bytes:
+        FILETIME.pack_into(self.buffer, FILETIME_OFFSET, filetime_now() if filetime is None else filetime)
+        return bytes(self.buffer)
+
+    @staticmethod
+    def pos_tel(telemetry_type: int, tmi_data: bytes | int,
+                fields: dict[Hashable, tuple[int, str]] | None = None) -> 'FrameTemplate':
+        """POSITION_TELEMETRY template; field offsets are relative to the start of `tmi_data` (bytes or a size)."""
+        data: bytes = bytes(tmi_data) if isinstance(tmi_data, int) else tmi_data
+        template = FrameTemplate(GatewayFrame(GatewayPosTel(telemetry_type, data)))
+        for name, (offset, fmt) in (fields or {}).items():
+            template.add_field(name, POS_TEL_DATA + offset, fmt)
+        return template
+
+    @staticmethod
+    def addr_tel(params: Iterable[AddrTelParameter],
+                 formats: dict[tuple[int, int], str] | None = None) -> 'FrameTemplate':
+        """ADDRESS_TELEMETRY template with one field per parameter named `(telemetry_type, arg_num)`.
+
+        Values are raw bytes of `arg_size` unless `formats` gives a struct format of that size for the parameter.
+        """
+        params = list(params)
+        template = FrameTemplate(GatewayFrame(GatewayAddrTel(*params)))
+        offset: int = ADDR_TEL_RECORDS
+        for param in params:
+            key: tuple[int, int] = (param.telemetry_type, param.arg_num)
+            fmt: str = (formats or {}).get(key, f'{param.arg_size}s')
+            if struct.calcsize(fmt) != param.arg_size:
+                raise ValueError(f'Format {fmt} of parameter {key} does not match its size {param.arg_size}')
+            template.add_field(key, offset + ADDR_TEL_RECORD_HEADER, fmt)
+            offset += ADDR_TEL_RECORD_HEADER + param.arg_size
+        return template
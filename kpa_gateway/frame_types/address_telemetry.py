@@ -1,60 +1,103 @@
-import struct
+from typing import Callable
 
-from kpa_gateway.frame_types.base_types import AbstractFrame, FrameID
+from kpa_gateway.frame_types.base_types import AbstractFrame, FrameID, as_buffer
+from kpa_gateway.frame_types.schema import FrameSchema, Records
 
 # from kpa_gateway.frame_types.base_types import FameAddrTelArgType
 
 
 class AddrTelParameter:
-    def __init__(self, arg_num: int, telemetry_type: int, value: bytes, arg_size: int = -1):
+    __slots__ = ('arg_num', 'telemetry_type', '_value')
+
+    def __init__(self, arg_num: int, telemetry_type: int, value: bytes | memoryview, arg_size: int = -1):
+        if arg_size >= 0 and arg_size != len(value):
+            raise ValueError(f'Incorrect AddrTel parameter size. Got {len(value)} but should be {arg_size}')
         self.arg_num: int = arg_num
         self.telemetry_type: int = telemetry_type
-        self.value: bytes = value
-        self.arg_size: int = len(self.value) if arg_size < 0 else arg_size
+        self._value: bytes | memoryview = value
+
+    @property
+    def arg_size(self) -> int:
+        return len(self._value)
+
+    @property
+    def value(self) -> bytes:
+        if not isinstance(self._value, bytes):
+            self._value = bytes(self._value)
+        return self._value
+
+    @value.setter
+    def value(self, value: bytes) -> None:
+        self._value = value
 
     @staticmethod
     def parse(data: bytes) -> 'AddrTelParameter':
-        fields = struct.unpack('<HHB', data[:5])
-        telemetry_type: int = fields[0]
-        arg_num: int = fields[1]
-        arg_size: int = fields[2]
-        value: bytes = data[5:5 + arg_size]
-        return AddrTelParameter(arg_num, telemetry_type, value)
+        buffer: memoryview = as_buffer(data)
+        return AddrTelParameter.parse_from(buffer, 0, len(buffer))
+
+    @staticmethod
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None) -> 'AddrTelParameter':
+        end = len(buffer) if end is None else end
+        return PARAMETER_RECORDS.decode_one(buffer, offset, end)
 
     def to_bytes(self) -> bytes:
-        return struct.pack('<HHB', self.telemetry_type, self.arg_num, self.arg_size) + self.value
+        return b''.join(PARAMETER_RECORDS.encode((self,)))
+
+    def wire_size(self) -> int:
+        return 5 + len(self._value)
 
     def __str__(self) -> str:
         return f'Type: {self.telemetry_type}\nArg num: {self.arg_num}\nArg size: {self.arg_size}\n'\
                f'Value: {self.value.hex(" ").upper()}'
 
 
+PARAMETER_RECORDS = Records('HHB',
+                            make=lambda telemetry_type, arg_num, value: AddrTelParameter(arg_num, telemetry_type,
+                                                                                         value),
+                            unmake=lambda arg: (arg.telemetry_type, arg.arg_num, arg.value))
+
+
 class GatewayAddrTel(AbstractFrame):
+    __slots__ = ('args',)
     frame_id: FrameID = FrameID.ADDRESS_TELEMETRY
+    schema = FrameSchema(FrameID.ADDRESS_TELEMETRY, 'H', PARAMETER_RECORDS)
+    _registered: dict[int, Callable] = {}
 
     def __init__(self, *args: AddrTelParameter):
         self.args: list[AddrTelParameter] = [*args]
-        self.arg_amount: int = len(self.args)
 
-    def to_bytes(self) -> bytes:
-        return struct.pack('<HH', self.frame_id.value, self.arg_amount) + b''.join([arg.to_bytes()
-                                                                                    for arg in self.args])
+    @property
+    def arg_amount(self) -> int:
+        return len(self.args)
+
+    def _cacheable(self) -> bool:
+        return False
+
+    def _encode(self) -> bytes:
+        return self.schema.encode((self.arg_amount,), self.args)
+
+    def _calc_size(self) -> int:
+        return 4 + sum(arg.wire_size() for arg in self.args)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayAddrTel':
-        arg_amount: int = struct.unpack('<H', data[:2])[0]
-        args: list[AddrTelParameter] = [arg for arg in GatewayAddrTel._parse_args(data[2:])]
-        if arg_amount != len(args):
-            raise ValueError(f'Incorrect FrameAddrTel arguments amount. Got {len(args)} but should be {arg_amount}')
-        return GatewayAddrTel(*args)
+    def listen(telemetry_type: int, callback: Callable) -> None:
+        GatewayAddrTel._registered.update({telemetry_type: callback})
 
     @staticmethod
-    def _parse_args(data: bytes):
-        ptr = 0
-        while ptr < len(data):
-            arg: AddrTelParameter = AddrTelParameter.parse(data[ptr:])
-            ptr += arg.arg_size + 5
-            yield arg
+    def route(telemetry_type: int) -> Callable | None:
+        return GatewayAddrTel._registered.get(telemetry_type, None)
+
+    @staticmethod
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None) -> 'GatewayAddrTel':
+        end = len(buffer) if end is None else end
+        schema: FrameSchema = GatewayAddrTel.schema
+        (arg_amount,) = schema.decode_header(buffer, offset, end)
+        args: list[AddrTelParameter] = PARAMETER_RECORDS.decode(buffer, offset + schema.fields.size, end)
+        if arg_amount != len(args):
+            raise ValueError(f'Incorrect FrameAddrTel arguments amount. Got {len(args)} but should be {arg_amount}')
+        frame = GatewayAddrTel()
+        frame.args = args
+        return frame
 
     def __str__(self) -> str:
         return f'ID: {self.frame_id}\nArg amount: {self.arg_amount}\nArgs: {[str(arg) for arg in self.args]}'
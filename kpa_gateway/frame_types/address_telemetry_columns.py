@@ -0,0 +1,107 @@
+import struct
+from typing import Iterable
+
+import numpy as np
+
+from kpa_gateway.frame_types.base_types import FrameID
+
+
+PARAMETER_DTYPE = np.dtype([
+    ('telemetry_type', '<u2'),
+    ('arg_num', '<u2'),
+    ('arg_size', 'u1'),
+    ('value_offset', '<u4'),
+    ('frame_index', '<u4'),
+])
+_FRAME_HEADER = struct.Struct('<HQHH')  # frame_length, timestamp, frame_id, arg_amount
+
+
+class AddrTelColumns:
+    """Address telemetry parameters of one or many frames as a structured array over one shared value buffer."""
+    def __init__(self, params: np.ndarray, values: np.ndarray) -> None:
+        self.params: np.ndarray = params
+        self.values: np.ndarray = values
+
+    @property
+    def telemetry_type(self) -> np.ndarray:
+        return self.params['telemetry_type']
+
+    @property
+    def arg_num(self) -> np.ndarray:
+        return self.params['arg_num']
+
+    @property
+    def arg_size(self) -> np.ndarray:
+        return self.params['arg_size']
+
+    @property
+    def value_offset(self) -> np.ndarray:
+        return self.params['value_offset']
+
+    @property
+    def frame_index(self) -> np.ndarray:
+        return self.params['frame_index']
+
+    def value(self, index: int) -> memoryview:
+        param = self.params[index]
+        start: int = int(param['value_offset'])
+        return self.values[start:start + int(param['arg_size'])].data
+
+    def values_as(self, dtype: np.dtype | str) -> np.ndarray:
+        """Reads every value as one scalar of `dtype`. All selected parameters must be at least that wide."""
+        dtype = np.dtype(dtype)
+        if len(self.params) and int(self.arg_size.min()) < dtype.itemsize:
+            raise ValueError(f'Some parameters are shorter than {dtype.itemsize} bytes')
+        windows: np.ndarray = self.value_offset[:, None] + np.arange(dtype.itemsize, dtype=np.uint32)
+        return self.values[windows].copy().view(dtype).reshape(-1)
+
+    def select(self, mask: np.ndarray) -> 'AddrTelColumns':
+        return AddrTelColumns(self.params[mask], self.values)
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+
+def decode_addr_tel(frame: bytes) -> AddrTelColumns:
+    return decode_addr_tel_batch([frame])
+
+
+def decode_addr_tel_batch(frames: Iterable[bytes]) -> AddrTelColumns:
+    """Decodes whole ADDRESS_TELEMETRY wire frames (as produced by GatewayFrame.to_bytes or the Deframer)."""
+    data: bytes = b''.join(frames)
+    starts: list[int] = []
+    counts: list[int] = []
+    append_start = starts.append
+    frame_start: int = 0
+    frame_index: int = 0
+    while frame_start < len(data):
+        try:
+            frame_length, _, frame_id, arg_amount = _FRAME_HEADER.unpack_from(data, frame_start)
+        except struct.error as err:
+            raise ValueError(f'Incorrect address telemetry frame {frame_index}: {err}') from err
+        if frame_id != FrameID.ADDRESS_TELEMETRY.value:
+            raise ValueError(f'Frame {frame_index} is not ADDRESS_TELEMETRY. Got frame_id {frame_id}')
+        end: int = frame_start + frame_length + 2
+        if end > len(data):
+            raise ValueError(f'Incorrect base frame length in frame {frame_index}')
+        first: int = len(starts)
+        ptr: int = frame_start + _FRAME_HEADER.size
+        while ptr + 5 <= end:
+            append_start(ptr)
+            ptr += 5 + data[ptr + 4]
+        if ptr != end or len(starts) - first != arg_amount:
+            raise ValueError(f'Incorrect FrameAddrTel arguments amount in frame {frame_index}. '
+                             f'Got {len(starts) - first} but should be {arg_amount}')
+        counts.append(len(starts) - first)
+        frame_start = end
+        frame_index += 1
+
+    values: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+    offsets: np.ndarray = np.array(starts, dtype=np.uint32)
+    params: np.ndarray = np.empty(len(starts), dtype=PARAMETER_DTYPE)
+    params['telemetry_type'] = values[offsets] | (values[offsets + 1].astype(np.uint16) << 8)
+    params['arg_num'] = values[offsets + 2] | (values[offsets + 3].astype(np.uint16) << 8)
+    params['arg_size'] = values[offsets + 4]
+    params['value_offset'] = offsets + 5
+    params['frame_index'] = np.repeat(np.arange(len(counts), dtype=np.uint32), counts)
+    return AddrTelColumns(params, values)
@@ -38,12 +38,84 @@ ARG_SIZES: dict[FrameCMDArgType, tuple[int, str]] = {
 }
 
 
+def as_buffer(data: bytes | bytearray | memoryview) -> memoryview:
+    view: memoryview = data if isinstance(data, memoryview) else memoryview(data)
+    if view.nbytes != len(view.obj):  # type: ignore
+        # parsers search terminators through view.obj, so offsets must be relative to the whole object
+        view = memoryview(view.tobytes())
+    return view
+
+
+def find_null(buffer: memoryview, start: int, end: int) -> int:
+    return buffer.obj.find(b'\x00', start, end)  # type: ignore
+
+
+def split_strings(buffer: memoryview, ptr: int, end: int) -> list[str]:
+    strings: list[str] = []
+    while True:
+        str_end: int = find_null(buffer, ptr, end)
+        if str_end < 0:
+            strings.append(str(buffer[ptr:end], 'utf-8'))
+            return strings
+        strings.append(str(buffer[ptr:str_end], 'utf-8'))
+        ptr = str_end + 1
+
+
+def utf8_len(string: str) -> int:
+    return len(string) if string.isascii() else len(string.encode('utf-8'))
+
+
 class AbstractFrame(metaclass=ABCMeta):
+    """Frames are slotted; counts such as `arg_amount` are derived from the contents instead of being stored.
+
+    The encoding is kept until a public field is assigned, but only while `_cacheable` holds: contents that can change
+    in place (args and strings lists, parameters, bytearrays) are encoded again on every call.
+    """
+    __slots__ = ('_raw', '_rev')
     frame_id: FrameID
 
-    def to_bytes(self):
+    def __new__(cls, *args, **kwargs):
+        self = object.__new__(cls)
+        object.__setattr__(self, '_raw', None)
+        object.__setattr__(self, '_rev', 0)
+        return self
+
+    def __setattr__(self, name: str, value) -> None:
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        object.__setattr__(self, '_raw', None)
+        object.__setattr__(self, '_rev', self._rev + 1)
+
+    def _cacheable(self) -> bool:
+        return True
+
+    def to_bytes(self) -> bytes:
+        if not self._cacheable():
+            return self._encode()
+        raw: bytes | memoryview | None = self._raw
+        if raw is None:
+            raw = self._raw = self._encode()
+        elif not isinstance(raw, bytes):
+            raw = self._raw = bytes(raw)
+        return raw
+
+    def wire_size(self) -> int:
+        return len(self._raw) if self._raw is not None and self._cacheable() else self._calc_size()
+
+    def _encode(self) -> bytes:
+        raise NotImplementedError
+
+    def _calc_size(self) -> int:
         raise NotImplementedError
 
+    @classmethod
+    def parse(cls, data: bytes):
+        buffer: memoryview = as_buffer(data)
+        return cls.parse_from(buffer, 0, len(buffer))
+
     @staticmethod
-    def parse(data: bytes):
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None):
         raise NotImplementedError
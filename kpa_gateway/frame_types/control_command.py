@@ -2,18 +2,50 @@
 
 
 import struct
-from typing import Any, Callable, Generator
-from kpa_gateway.frame_types.base_types import ARG_SIZES, AbstractFrame, FrameCMDArgType, FrameID
+from typing import Any, Callable
+from kpa_gateway.frame_types.base_types import AbstractFrame, FrameCMDArgType, FrameID
+from kpa_gateway.frame_types.schema import FrameSchema, TypedArgs
 
 
 class GatewayCMD(AbstractFrame):
+    __slots__ = ('cmd_type', 'cmd_code', '_args', '_args_span', '_arg_amount')
     frame_id: FrameID = FrameID.CMD
+    schema = FrameSchema(FrameID.CMD, 'HIH', TypedArgs())
     _registered: dict[int, dict] = {}
     def __init__(self, cmd_type: int, cmd_code: int, *args: tuple[FrameCMDArgType, Any]) -> None:
         self.cmd_type: int = cmd_type
         self.cmd_code: int = cmd_code
-        self.args: list[tuple[FrameCMDArgType, Any]] = [*args]
-        self.arg_amount: int = len(self.args)
+        self._args_span: tuple[memoryview, int, int] | None = None
+        self.args = [*args]
+
+    @property
+    def args(self) -> list[tuple[FrameCMDArgType, Any]]:
+        if self._args_span is not None:
+            buffer, ptr, end = self._args_span
+            try:
+                args: list[tuple[FrameCMDArgType, Any]] = self.schema.body.decode(buffer, ptr, end)  # type: ignore
+            except struct.error as err:
+                raise ValueError(f'Incorrect CMD frame: {err}') from err
+            if self._arg_amount != len(args):
+                raise ValueError(f'Incorrect FrameCMD arguments amount. Got {len(args)} but should be '
+                                 f'{self._arg_amount}')
+            size: int = self.schema.body.size(args)  # type: ignore
+            if size != end - ptr:
+                raise ValueError(f'Incorrect FrameCMD arguments size. Got {size} but should be {end - ptr}')
+            self._args = args
+            self._args_span = None
+        return self._args
+
+    @args.setter
+    def args(self, args: list[tuple[FrameCMDArgType, Any]]) -> None:
+        self._args = args
+        self._args_span = None
+        self.invalidate()
+
+    @property
+    def arg_amount(self) -> int:
+        # the header value until lazily parsed arguments are decoded
+        return self._arg_amount if self._args_span is not None else len(self._args)
 
     @staticmethod
     def listen(cmd_type: int, cmd_code: int, callback: Callable, *args) -> None:
@@ -28,48 +60,27 @@ class GatewayCMD(AbstractFrame):
         return GatewayCMD._registered.get(cmd_type, {}).get(cmd_code, None)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayCMD':
-        fields = struct.unpack('<HIH', data[:8])
-        cmd_type: int = fields[0]
-        cmd_code: int = fields[1]
-        arg_amount: int = fields[2]
-        args: list[tuple[FrameCMDArgType, Any]] = [arg for arg in GatewayCMD._parse_args(data[8:])]
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None, lazy: bool = False) -> 'GatewayCMD':
+        end = len(buffer) if end is None else end
+        if lazy:  # arguments are decoded on the first access to `args`
+            cmd_type, cmd_code, arg_amount = GatewayCMD.schema.decode_header(buffer, offset, end)
+            frame = GatewayCMD(cmd_type, cmd_code)
+            frame._arg_amount = arg_amount
+            frame._args_span = (buffer, offset + GatewayCMD.schema.fields.size, end)
+            return frame
+        (cmd_type, cmd_code, arg_amount), args = GatewayCMD.schema.decode(buffer, offset, end)
         if arg_amount != len(args):
             raise ValueError(f'Incorrect FrameCMD arguments amount. Got {len(args)} but should be {arg_amount}')
         return GatewayCMD(cmd_type, cmd_code, *args)
 
-    def to_bytes(self) -> bytes:
-        data: bytes = struct.pack('<HHIH', self.frame_id.value, self.cmd_type, self.cmd_code, self.arg_amount)
-        return data + self._args_to_bytes()
+    def _cacheable(self) -> bool:
+        return self._args_span is not None  # the args list has not been handed out yet
 
-    def _args_to_bytes(self) -> bytes:
-        result: bytes = b''
-        for (arg_type, arg) in self.args:
-            result += struct.pack('<H', arg_type.value)
-            pack_label: str = ARG_SIZES[arg_type][1]
-            if arg_type == FrameCMDArgType.STRING:
-                result += struct.pack(pack_label, arg.encode('utf-8'))
-            else:
-                result += struct.pack(pack_label, arg)
-        return result
+    def _encode(self) -> bytes:
+        return self.schema.encode((self.cmd_type, self.cmd_code, self.arg_amount), self.args)
 
-    @staticmethod
-    def _parse_args(data: bytes) -> Generator[tuple[FrameCMDArgType, Any], Any, None]:
-        ptr = 0
-        while ptr < len(data):
-            arg_type: FrameCMDArgType = FrameCMDArgType(struct.unpack('<H', data[ptr:ptr + 2])[0])
-            arg_size, pack_label = ARG_SIZES[arg_type]
-            ptr += 2 + arg_size
-            if arg_type == FrameCMDArgType.STRING:
-                result = data[ptr:].split(b'\x00')[0].decode('utf-8')
-                ptr += len(result) + 1
-            elif arg_type == FrameCMDArgType.MBYTE:
-                array_size: int = struct.unpack('<H', data[ptr:ptr + 2])[0]
-                result = data[ptr + 2: ptr + array_size]
-            else:
-                val = data[ptr - arg_size: ptr]
-                result = struct.unpack(pack_label, val)[0]
-            yield arg_type, result
+    def _calc_size(self) -> int:
+        return self.schema.size(self.args)
 
     def __str__(self) -> str:
         return f'ID: {self.frame_id}\nType: {self.cmd_type}\nCode: {self.cmd_code}\nArg amount: {self.arg_amount}\n'\
@@ -1,23 +1,32 @@
-import struct
-
 from kpa_gateway.frame_types.base_types import AbstractFrame, FrameID
+from kpa_gateway.frame_types.schema import FrameSchema, Strings, Tail
 
 
 class GatewayMessage(AbstractFrame):
+    __slots__ = ('strings',)
     frame_id: FrameID = FrameID.MESSAGE
+    schema = FrameSchema(FrameID.MESSAGE, 'H', Strings())
 
     def __init__(self, *strings: str) -> None:
         self.strings: list[str] = [*strings]
-        self.str_amount: int = len(self.strings)
 
-    def to_bytes(self) -> bytes:
-        return struct.pack('<HH', self.frame_id.value, self.str_amount) + b''.join([arg.encode('utf-8')
-                                                                                    for arg in self.strings])
+    @property
+    def str_amount(self) -> int:
+        return len(self.strings)
+
+    def _cacheable(self) -> bool:
+        return False
+
+    def _encode(self) -> bytes:
+        return self.schema.encode((self.str_amount,), self.strings)
+
+    def _calc_size(self) -> int:
+        return self.schema.size(self.strings)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayMessage':
-        str_amount: int = struct.unpack('<H', data[:2])[0]
-        strings: list[str] = [msg.decode('utf-8') for msg in data[2:].split(b'\x00')]
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None) -> 'GatewayMessage':
+        end = len(buffer) if end is None else end
+        (str_amount,), strings = GatewayMessage.schema.decode(buffer, offset, end)
         if str_amount != len(strings):
             raise ValueError(f'Incorrect FrameMessage arguments amount. Got {len(strings)} but should be {str_amount}')
         return GatewayMessage(*strings)
@@ -27,19 +36,24 @@ class GatewayMessage(AbstractFrame):
 
 
 class GatewayLogMessage(AbstractFrame):
+    __slots__ = ('message_type', 'message')
     frame_id: FrameID = FrameID.LOG_MESSAGE
+    schema = FrameSchema(FrameID.LOG_MESSAGE, 'H', Tail(text=True))
 
     def __init__(self, message_type: int, msg: str) -> None:
         self.message_type: int = message_type
         self.message: str = msg
 
-    def to_bytes(self) -> bytes:
-        return struct.pack('<HH', self.frame_id.value, self.message_type) + self.message.encode('utf-8')
+    def _encode(self) -> bytes:
+        return self.schema.encode((self.message_type,), self.message)
+
+    def _calc_size(self) -> int:
+        return self.schema.size(self.message)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayLogMessage':
-        message_type: int = struct.unpack('<H', data[:2])[0]
-        message: str = data[2:].decode('utf-8')
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None) -> 'GatewayLogMessage':
+        end = len(buffer) if end is None else end
+        (message_type,), message = GatewayLogMessage.schema.decode(buffer, offset, end)
         return GatewayLogMessage(message_type, message)
 
     def __str__(self) -> str:
@@ -1,19 +1,42 @@
-import struct
 from typing import Callable
 
 from kpa_gateway.frame_types.base_types import AbstractFrame, FrameID
+from kpa_gateway.frame_types.schema import FrameSchema, Tail
 
 
 class GatewayPosTel(AbstractFrame):
+    __slots__ = ('telemetry_type', '_tmi_data')
     frame_id: FrameID = FrameID.POSITION_TELEMETRY
+    schema = FrameSchema(FrameID.POSITION_TELEMETRY, 'HH', Tail())
     _registered: dict = {}
-    def __init__(self, telemetry_type: int, tmi_data: bytes) -> None:
+    def __init__(self, telemetry_type: int, tmi_data: bytes | memoryview) -> None:
         self.telemetry_type: int = telemetry_type
-        self.tmi_data: bytes = tmi_data
-        self.size: int = len(self.tmi_data)
+        self._tmi_data: bytes | memoryview = tmi_data
 
-    def to_bytes(self) -> bytes:
-        return struct.pack('<HHH', self.frame_id.value, self.telemetry_type, self.size) + self.tmi_data
+    @property
+    def size(self) -> int:
+        return len(self._tmi_data)
+
+    @property
+    def tmi_data(self) -> bytes:
+        if not isinstance(self._tmi_data, bytes):
+            self._tmi_data = bytes(self._tmi_data)
+        return self._tmi_data
+
+    @tmi_data.setter
+    def tmi_data(self, tmi_data: bytes) -> None:
+        self._tmi_data = tmi_data
+        self.invalidate()
+
+    def _cacheable(self) -> bool:
+        data: bytes | memoryview = self._tmi_data
+        return isinstance(data, bytes) or (isinstance(data, memoryview) and data.readonly)
+
+    def _encode(self) -> bytes:
+        return self.schema.encode((self.telemetry_type, self.size), self._tmi_data)
+
+    def _calc_size(self) -> int:
+        return self.schema.size(self._tmi_data)
 
     @staticmethod
     def listen(telemetry_type: int, callback: Callable, *args) -> None:
@@ -24,11 +47,9 @@ class GatewayPosTel(AbstractFrame):
         return GatewayPosTel._registered.get(telemetry_type, None)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayPosTel':
-        fields = struct.unpack('<HH', data[:4])
-        telemetry_type: int = fields[0]
-        size: int = fields[1]
-        tmi_data: bytes = data[4:]
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None) -> 'GatewayPosTel':
+        end = len(buffer) if end is None else end
+        (telemetry_type, size), tmi_data = GatewayPosTel.schema.decode(buffer, offset, end)
         if size != len(tmi_data):
             raise ValueError(f'Incorrect FramePosTel data length. Got {len(tmi_data)} but should be {size}')
         return GatewayPosTel(telemetry_type, tmi_data)
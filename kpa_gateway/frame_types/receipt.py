@@ -1,28 +1,33 @@
-
-import struct
-
 from kpa_gateway.frame_types.base_types import AbstractFrame, FrameID
+from kpa_gateway.frame_types.schema import FrameSchema, Strings
 
 
 class GatewayReceipt(AbstractFrame):
+    __slots__ = ('return_code', 'receipt_num', 'strings')
     frame_id: FrameID = FrameID.RECEIPT
+    schema = FrameSchema(FrameID.RECEIPT, 'HHH', Strings(skip_empty=True))
     def __init__(self, receipt_num: int, return_code: int, *strings: str) -> None:
         self.return_code: int = return_code
         self.receipt_num: int = receipt_num
-        self.arg_amount: int = len(strings)
         self.strings: list[str] = [*strings]
 
-    def to_bytes(self) -> bytes:
-        data: bytes = struct.pack('<HHHH', self.frame_id.value, self.receipt_num, self.return_code, self.arg_amount)
-        return data + b''.join(msg.encode('utf-8') for msg in self.strings)
+    @property
+    def arg_amount(self) -> int:
+        return len(self.strings)
+
+    def _cacheable(self) -> bool:
+        return False
+
+    def _encode(self) -> bytes:
+        return self.schema.encode((self.receipt_num, self.return_code, self.arg_amount), self.strings)
+
+    def _calc_size(self) -> int:
+        return self.schema.size(self.strings)
 
     @staticmethod
-    def parse(data: bytes) -> 'GatewayReceipt':
-        fields = struct.unpack('<HHH', data[:6])
-        receipt_num: int = fields[0]
-        return_code: int = fields[1]
-        arg_amount: int = fields[2]
-        strings: list[str] = [arg.decode('utf-8') for arg in data[6:].split(b'\x00') if len(arg)]
+    def parse_from(buffer: memoryview, offset: int = 0, end: int | None = None) -> 'GatewayReceipt':
+        end = len(buffer) if end is None else end
+        (receipt_num, return_code, arg_amount), strings = GatewayReceipt.schema.decode(buffer, offset, end)
         if arg_amount != len(strings):
             raise ValueError(f'Incorrect FrameReceipt arguments amount. Got {len(strings)} but should be {arg_amount}')
         return GatewayReceipt(receipt_num, return_code, *strings)
@@ -0,0 +1,192 @@
+import struct
+from typing import Any, Callable, Sequence
+
+from kpa_gateway.frame_types.base_types import ARG_SIZES, FrameCMDArgType, FrameID, find_null, split_strings, utf8_len
+
+
+class TypedArgs:
+    """Counted list of (FrameCMDArgType, value) pairs, each prefixed with a `<H` type code."""
+    _size_field = struct.Struct('<H')
+
+    def __init__(self) -> None:
+        self._types: dict[int, FrameCMDArgType] = {arg_type.value: arg_type for arg_type in FrameCMDArgType}
+        self._fixed: dict[FrameCMDArgType, tuple[int, struct.Struct]] = {}
+        self._prefixed: dict[FrameCMDArgType, struct.Struct] = {}
+        for arg_type, (arg_size, pack_label) in ARG_SIZES.items():
+            if arg_size:
+                self._fixed[arg_type] = (arg_size, struct.Struct(pack_label))
+                self._prefixed[arg_type] = struct.Struct('<H' + pack_label[1:])
+
+    def encode(self, args: Sequence[tuple[FrameCMDArgType, Any]]) -> list[bytes]:
+        chunks: list[bytes] = []
+        append = chunks.append
+        prefixed: dict[FrameCMDArgType, struct.Struct] = self._prefixed
+        for (arg_type, arg) in args:
+            codec: struct.Struct | None = prefixed.get(arg_type)
+            if codec is not None:
+                append(codec.pack(arg_type.value, arg))
+            elif arg_type == FrameCMDArgType.STRING:
+                append(self._size_field.pack(arg_type.value))
+                append(arg.encode('utf-8') + b'\x00')
+            else:  # MBYTE, the size field includes itself
+                append(struct.pack('<HH', arg_type.value, len(arg) + 2))
+                append(bytes(arg))
+        return chunks
+
+    def size(self, args: Sequence[tuple[FrameCMDArgType, Any]]) -> int:
+        size: int = 0
+        fixed: dict[FrameCMDArgType, tuple[int, struct.Struct]] = self._fixed
+        for (arg_type, arg) in args:
+            if arg_type in fixed:
+                size += 2 + fixed[arg_type][0]
+            elif arg_type == FrameCMDArgType.STRING:
+                size += 3 + utf8_len(arg)
+            else:
+                size += 4 + len(arg)
+        return size
+
+    def decode(self, buffer: memoryview, ptr: int, end: int) -> list[tuple[FrameCMDArgType, Any]]:
+        args: list[tuple[FrameCMDArgType, Any]] = []
+        append = args.append
+        types: dict[int, FrameCMDArgType] = self._types
+        fixed: dict[FrameCMDArgType, tuple[int, struct.Struct]] = self._fixed
+        unpack_type = self._size_field.unpack_from
+        while ptr < end:
+            type_value: int = unpack_type(buffer, ptr)[0]
+            arg_type: FrameCMDArgType | None = types.get(type_value)
+            if arg_type is None:
+                raise ValueError(f'{type_value} is not a valid FrameCMDArgType')
+            ptr += 2
+            if arg_type in fixed:
+                arg_size, codec = fixed[arg_type]
+                result: Any = codec.unpack_from(buffer, ptr)[0]
+                ptr += arg_size
+            elif arg_type == FrameCMDArgType.STRING:
+                str_end: int = find_null(buffer, ptr, end)
+                if str_end < 0:
+                    raise ValueError('Incorrect FrameCMD STRING argument. Null terminator not found')
+                result = str(buffer[ptr:str_end], 'utf-8')
+                ptr = str_end + 1
+            else:
+                array_size: int = unpack_type(buffer, ptr)[0]
+                result = bytes(buffer[ptr + 2:ptr + array_size])
+                ptr += max(array_size, 2)
+            if ptr > end:
+                raise ValueError(f'Incorrect FrameCMD {arg_type.name} argument. Frame is truncated')
+            append((arg_type, result))
+        return args
+
+
+class Records:
+    """Counted list of fixed-header records followed by a value whose length is the last header field.
+
+    The length field is written from and checked against the value itself, so `make` and `unmake` deal only with
+    the other fields and the value.
+    """
+    def __init__(self, fields: str, make: Callable[..., Any], unmake: Callable[[Any], tuple]) -> None:
+        self.header = struct.Struct('<' + fields)
+        self.make: Callable[..., Any] = make
+        self.unmake: Callable[[Any], tuple] = unmake
+
+    def encode(self, records: Sequence[Any]) -> list[bytes]:
+        pack = self.header.pack
+        unmake = self.unmake
+        chunks: list[bytes] = []
+        append = chunks.append
+        for record in records:
+            *fields, value = unmake(record)
+            append(pack(*fields, len(value)))
+            append(value)
+        return chunks
+
+    def size(self, records: Sequence[Any]) -> int:
+        header_size: int = self.header.size
+        return sum(header_size + len(self.unmake(record)[-1]) for record in records)
+
+    def decode_one(self, buffer: memoryview, ptr: int, end: int) -> Any:
+        fields: tuple = self.header.unpack_from(buffer, ptr)
+        value_start: int = ptr + self.header.size
+        value_end: int = value_start + fields[-1]
+        if value_end > end:
+            raise ValueError(f'Incorrect record size. Got {end - value_start} but should be {fields[-1]}')
+        return self.make(*fields[:-1], buffer[value_start:value_end])
+
+    def decode(self, buffer: memoryview, ptr: int, end: int) -> list[Any]:
+        unpack = self.header.unpack_from
+        header_size: int = self.header.size
+        make = self.make
+        records: list[Any] = []
+        append = records.append
+        while ptr < end:
+            fields: tuple = unpack(buffer, ptr)
+            value_start: int = ptr + header_size
+            ptr = value_start + fields[-1]
+            if ptr > end:
+                raise ValueError(f'Incorrect record size. Got {end - value_start} but should be {fields[-1]}')
+            append(make(*fields[:-1], buffer[value_start:ptr]))
+        return records
+
+
+class Strings:
+    """Null separated utf-8 strings up to the end of the frame."""
+    def __init__(self, skip_empty: bool = False) -> None:
+        self.skip_empty: bool = skip_empty
+
+    def encode(self, strings: Sequence[str]) -> list[bytes]:
+        return [b'\x00'.join([string.encode('utf-8') for string in strings])]
+
+    def size(self, strings: Sequence[str]) -> int:
+        return sum(utf8_len(string) for string in strings) + max(len(strings) - 1, 0)
+
+    def decode(self, buffer: memoryview, ptr: int, end: int) -> list[str]:
+        strings: list[str] = split_strings(buffer, ptr, end)
+        return [string for string in strings if len(string)] if self.skip_empty else strings
+
+
+class Tail:
+    """Raw bytes (kept as a view) or a utf-8 string up to the end of the frame."""
+    def __init__(self, text: bool = False) -> None:
+        self.text: bool = text
+
+    def encode(self, tail: bytes | str) -> list[bytes]:
+        return [tail.encode('utf-8') if isinstance(tail, str) else tail]
+
+    def size(self, tail: bytes | memoryview | str) -> int:
+        return utf8_len(tail) if isinstance(tail, str) else len(tail)
+
+    def decode(self, buffer: memoryview, ptr: int, end: int) -> memoryview | str:
+        return str(buffer[ptr:end], 'utf-8') if self.text else buffer[ptr:end]
+
+
+BODY_TYPES = TypedArgs | Records | Strings | Tail
+
+
+class FrameSchema:
+    """Frame layout: frame_id, fixed header fields and an optional body. Compiled once per frame type."""
+    def __init__(self, frame_id: FrameID, fields: str, body: BODY_TYPES | None = None) -> None:
+        self.frame_id: FrameID = frame_id
+        self.header = struct.Struct('<H' + fields)
+        self.fields = struct.Struct('<' + fields)
+        self.body: BODY_TYPES | None = body
+        self.header_size: int = self.header.size
+
+    def encode(self, fields: tuple, body: Any = None) -> bytes:
+        header: bytes = self.header.pack(self.frame_id.value, *fields)
+        if self.body is None:
+            return header
+        return b''.join([header, *self.body.encode(body)])
+
+    def size(self, body: Any = None) -> int:
+        return self.header_size + (self.body.size(body) if self.body is not None else 0)
+
+    def decode_header(self, buffer: memoryview, offset: int, end: int) -> tuple:
+        if end - offset < self.fields.size:
+            raise ValueError(f'Incorrect {self.frame_id.name} frame. Got {end - offset} bytes of header but '
+                             f'should be {self.fields.size}')
+        return self.fields.unpack_from(buffer, offset)
+
+    def decode(self, buffer: memoryview, offset: int, end: int) -> tuple[tuple, Any]:
+        fields: tuple = self.decode_header(buffer, offset, end)
+        if self.body is None:
+            return fields, None
+        return fields, self.body.decode(buffer, offset + self.fields.size, end)
@@ -1,10 +1,10 @@
 
-from datetime import datetime
 from pathlib import Path
 from socket import socket
 from PyQt6 import QtWidgets
 from PyQt6.uic.load_ui import loadUi
 from kpa_gateway.api_gateway import API_Gateway, ReceivedData
+from kpa_gateway.log_view import LogView, hex_text
 
 
 class GatewayServer(QtWidgets.QWidget):
@@ -13,7 +13,7 @@ class GatewayServer(QtWidgets.QWidget):
     tmi2_period_spinbox: QtWidgets.QSpinBox
     tmi1_checkbox: QtWidgets.QCheckBox
     tmi2_checkbox: QtWidgets.QCheckBox
-    server_log_text_browser: QtWidgets.QTextBrowser
+    server_log_view: LogView
 
     def __init__(self, server: API_Gateway) -> None:
         super().__init__()
@@ -33,23 +33,17 @@ class GatewayServer(QtWidgets.QWidget):
 
     def on_connected(self, data: dict[str, socket]) -> None:
         connected_ip: str = list(data)[0]
-        ts: str = datetime.now().isoformat(" ", "seconds")
-        self.server_log_text_browser.append(f'{ts}: Соединение с {self.message.get(connected_ip, connected_ip)} '\
-                                            f'установлено')
+        self.server_log_view.append(f'Соединение с {self.message.get(connected_ip, connected_ip)} установлено')
 
     def on_disconnected(self, data: dict[str, socket]) -> None:
         connected_ip: str = list(data)[0]
-        ts: str = datetime.now().isoformat(" ", "seconds")
-        self.server_log_text_browser.append(f'{ts}: Соединение с {self.message.get(connected_ip, connected_ip)} '\
-                                            f'разорвано')
+        self.server_log_view.append(f'Соединение с {self.message.get(connected_ip, connected_ip)} разорвано')
 
     def on_received(self, data: ReceivedData) -> None:
-        ts: str = datetime.now().isoformat(" ", "seconds")
-        self.server_log_text_browser.append(f'{ts} rx: {data.msg.hex(" ").upper()}')
+        self.server_log_view.post(data.msg, 'rx', hex_text)
 
     def on_transmited(self, data: bytes) -> None:
-        ts: str = datetime.now().isoformat(" ", "seconds")
-        self.server_log_text_browser.append(f'{ts} tx: {data.hex(" ").upper()}')
+        self.server_log_view.post(data, 'tx', hex_text)
 
     def disable_telemetry(self) -> bool:
         self.tmi1_checkbox.setChecked(False)
@@ -0,0 +1,241 @@
+from collections import deque
+from enum import Enum
+import heapq
+from itertools import count
+import struct
+from threading import Condition, Lock, Thread
+import time
+from typing import Any, Callable, NamedTuple
+import weakref
+
+from loguru import logger
+
+from kpa_gateway.frame_types.base_types import FrameID
+from kpa_gateway.utils import TokenBucket
+
+
+FRAME_ID = struct.Struct('<H')
+FRAME_ID_OFFSET = 10  # after frame_length and filetime
+
+
+class IngressAction(Enum):
+    DROP = 'drop'
+    DELAY = 'delay'  # hold the frame, and those after it, until a token is available
+    NACK = 'nack'  # drop and answer with a GatewayReceipt with a non-zero return code
+    DISCONNECT = 'disconnect'
+
+
+class IngressLimit(NamedTuple):
+    rate: float  # frames per second
+    burst: float | None = None  # bucket size, `rate` (at least 1) when not set
+    action: IngressAction = IngressAction.DROP
+
+
+class ConnectionLimits:
+    __slots__ = ('name', 'frames', 'frame_ids', 'errors', 'limited', '__weakref__')
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.frames: TokenBucket | None = None
+        self.frame_ids: dict[int, TokenBucket] = {}
+        self.errors: TokenBucket | None = None
+        self.limited: dict[str, int] = {}
+
+
+def frame_id_of(raw_frame: bytes | memoryview) -> int:
+    return FRAME_ID.unpack_from(raw_frame, FRAME_ID_OFFSET)[0] if len(raw_frame) >= FRAME_ID_OFFSET + 2 else 0
+
+
+class IngressLimiter:
+    """Token buckets per connection, per connection and FrameID, and per connection for malformed input.
+
+    `check` runs on every deframed frame before it is parsed and returns what to do with it (None to accept it)
+    and, for DELAY, how long to wait first. The per-FrameID limit is checked first, so a frame type over its own
+    budget does not use up the connection budget of the others. `error` is called for input that could not be
+    deframed or parsed, or has an unknown FrameID; its limit is usually a small burst with DISCONNECT, other actions
+    there only count.
+    """
+    def __init__(self, connection: IngressLimit | None = None,
+                 frame_ids: dict[FrameID, IngressLimit] | None = None, errors: IngressLimit | None = None) -> None:
+        self.connection: IngressLimit | None = connection
+        self.frame_ids: dict[int, IngressLimit] = {frame_id.value: limit
+                                                   for frame_id, limit in (frame_ids or {}).items()}
+        self.errors: IngressLimit | None = errors
+        self._connections: weakref.WeakKeyDictionary[Any, ConnectionLimits] = weakref.WeakKeyDictionary()
+        self._lock = Lock()
+        self.limited: dict[tuple[str, str], int] = {}
+
+    def _state(self, conn: Any) -> ConnectionLimits:
+        state: ConnectionLimits | None = self._connections.get(conn)
+        if state is None:
+            with self._lock:
+                state = self._connections.get(conn)
+                if state is None:
+                    state = self._connections[conn] = ConnectionLimits(_peer_name(conn))
+                    if self.connection:
+                        state.frames = TokenBucket(self.connection.rate, self.connection.burst)
+                    if self.errors:
+                        state.errors = TokenBucket(self.errors.rate, self.errors.burst)
+        return state
+
+    def _apply(self, state: ConnectionLimits, bucket: TokenBucket, limit: IngressLimit,
+               label: str) -> tuple[IngressAction | None, float]:
+        if limit.action == IngressAction.DELAY:
+            wait: float = bucket.reserve()
+            if not wait:
+                return None, 0
+        elif bucket.take():
+            return None, 0
+        else:
+            wait = 0
+        key: tuple[str, str] = (label, limit.action.value)
+        self.limited[key] = self.limited.get(key, 0) + 1
+        state.limited[label] = state.limited.get(label, 0) + 1
+        return limit.action, wait
+
+    def check(self, conn: Any, raw_frame: bytes | memoryview) -> tuple[IngressAction | None, float]:
+        state: ConnectionLimits = self._state(conn)
+        frame_id: int = frame_id_of(raw_frame)
+        limit: IngressLimit | None = self.frame_ids.get(frame_id)
+        if limit is not None:
+            bucket: TokenBucket | None = state.frame_ids.get(frame_id)
+            if bucket is None:
+                bucket = state.frame_ids[frame_id] = TokenBucket(limit.rate, limit.burst)
+            action, wait = self._apply(state, bucket, limit, _label(frame_id))
+            if action is not None:
+                return action, wait
+        if state.frames is not None:
+            return self._apply(state, state.frames, self.connection, 'connection')  # type: ignore
+        return None, 0
+
+    def error(self, conn: Any) -> IngressAction | None:
+        state: ConnectionLimits = self._state(conn)
+        if state.errors is None:
+            return None
+        return self._apply(state, state.errors, self.errors, 'errors')[0]  # type: ignore
+
+    def name(self, conn: Any) -> str:
+        return self._state(conn).name
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Limited frames per connection and limit."""
+        return {state.name: dict(state.limited) for state in list(self._connections.values())}
+
+
+class IngressBacklog:
+    """Frames of connections held back by a DELAY limit, routed in order from one thread when their time comes.
+
+    A delayed frame has already reserved its token, so it is routed as is when due; the frames queued behind it are
+    checked again by `admit` (the gateway's limiter step) as they come up. Each connection holds at most
+    `max_frames`, the rest is dropped and counted.
+    """
+    def __init__(self, admit: Callable[[bytes, Any], float | None], route: Callable[[bytes, Any], None],
+                 max_frames: int = 4096) -> None:
+        self.admit: Callable[[bytes, Any], float | None] = admit
+        self.route: Callable[[bytes, Any], None] = route
+        self.max_frames: int = max_frames
+        self._queues: dict[Any, deque[bytes]] = {}
+        self._heap: list[tuple[float, int, Any]] = []
+        self._seq = count()
+        self._cond = Condition()
+        self.deferred: int = 0
+        self.dropped: int = 0
+        self._thread = Thread(name='ingress_backlog', daemon=True, target=self._routine)
+        self._thread.start()
+
+    def push(self, conn: Any, raw_frame: bytes) -> bool:
+        """Queues the frame behind the held ones of its connection; False if the connection has none."""
+        with self._cond:
+            queue: deque[bytes] | None = self._queues.get(conn)
+            if queue is None:
+                return False
+            self._append(queue, raw_frame)
+            return True
+
+    def defer(self, conn: Any, raw_frame: bytes, wait: float) -> None:
+        with self._cond:
+            queue: deque[bytes] | None = self._queues.get(conn)
+            if queue is None:
+                queue = self._queues[conn] = deque()
+                heapq.heappush(self._heap, (time.monotonic() + wait, next(self._seq), conn))
+                self._cond.notify()
+            self._append(queue, raw_frame)
+
+    def _append(self, queue: deque[bytes], raw_frame: bytes) -> None:
+        if len(queue) >= self.max_frames:
+            self.dropped += 1
+            return
+        queue.append(raw_frame)
+        self.deferred += 1
+
+    def discard(self, conn: Any) -> None:
+        with self._cond:
+            queue: deque[bytes] | None = self._queues.pop(conn, None)
+        if queue:
+            self.dropped += len(queue)
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in list(self._queues.values()))
+
+    def _routine(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                conn: Any = heapq.heappop(self._heap)[2]
+            try:
+                self._drain(conn)
+            except Exception as err:
+                logger.exception(err)
+
+    def _drain(self, conn: Any) -> None:
+        """Routes the connection's held frames until one has to wait again. The queue stays registered until it is
+        empty, so frames arriving meanwhile keep queueing behind."""
+        admitted: bool = True  # the head frame reserved its token when it was deferred
+        while True:
+            with self._cond:
+                queue: deque[bytes] | None = self._queues.get(conn)
+                if queue is None:  # disconnected meanwhile
+                    return
+                if not queue:
+                    del self._queues[conn]
+                    return
+                raw_frame: bytes = queue.popleft()
+            if not admitted:
+                wait: float | None = self.admit(raw_frame, conn)
+                if wait is None:
+                    continue
+                if wait:
+                    with self._cond:
+                        queue = self._queues.get(conn)
+                        if queue is not None:
+                            queue.appendleft(raw_frame)
+                            heapq.heappush(self._heap, (time.monotonic() + wait, next(self._seq), conn))
+                            self._cond.notify()
+                    return
+            admitted = False
+            self.route(raw_frame, conn)
+
+    def clear(self) -> None:
+        with self._cond:
+            self.dropped += sum(len(queue) for queue in self._queues.values())
+            self._queues.clear()
+            self._heap.clear()
+
+
+def _label(frame_id: int) -> str:
+    try:
+        return FrameID(frame_id).name
+    except ValueError:
+        return str(frame_id)
+
+
+def _peer_name(conn: Any) -> str:
+    ip: str | None = getattr(conn, 'ip', None)
+    if ip:
+        return ip
+    try:
+        peer: Any = conn.getpeername()
+    except (AttributeError, OSError):
+        return str(id(conn))
+    return peer[0] if isinstance(peer, tuple) else str(peer or id(conn))
@@ -0,0 +1,137 @@
+import struct
+from threading import Lock
+from typing import Hashable, Iterable, NamedTuple
+
+from kpa_gateway.frame_parser import GatewayFrame
+from kpa_gateway.frame_types.address_telemetry import AddrTelParameter, GatewayAddrTel
+from kpa_gateway.utils import filetime_now
+
+
+MAX_ADDR_TEL_SIZE = 0xFFFF - 8  # frame_length is a WORD and counts the 8 bytes of FILETIME
+
+
+class Deadband(NamedTuple):
+    """A value is forwarded only when it differs from the last forwarded one by more than `threshold`.
+
+    Values are decoded with the struct format `fmt`; values of another size are compared byte for byte.
+    """
+    threshold: float
+    fmt: str = '<f'
+
+
+class ParameterState:
+    __slots__ = ('telemetry_type', 'arg_num', 'value', 'forwarded', 'filetime', 'updates')
+
+    def __init__(self, telemetry_type: int, arg_num: int, value: bytes, filetime: int) -> None:
+        self.telemetry_type: int = telemetry_type
+        self.arg_num: int = arg_num
+        self.value: bytes = value
+        self.forwarded: bytes = value  # last value reported as changed, the reference for deadbands
+        self.filetime: int = filetime
+        self.updates: int = 1
+
+    @property
+    def arg_size(self) -> int:
+        return len(self.value)
+
+    def parameter(self) -> AddrTelParameter:
+        return AddrTelParameter(self.arg_num, self.telemetry_type, self.value)
+
+
+class LastValueCache:
+    """Current value of every `(telemetry_type, arg_num)` seen in address telemetry, updated in place.
+
+    `update` returns the parameters that changed (or moved past their deadband), which is what change-only
+    forwarding and handler dispatch use; `snapshot_frames` packs the whole table into frames for a new client.
+    Deadbands are keyed by `(telemetry_type, arg_num)` or by `telemetry_type` for all its parameters.
+    """
+    def __init__(self, deadbands: dict[Hashable, Deadband] | None = None) -> None:
+        self._states: dict[tuple[int, int], ParameterState] = {}
+        self._deadbands: dict[Hashable, tuple[float, struct.Struct]] = {}
+        self._lock = Lock()
+        self.updates: int = 0
+        self.changed: int = 0
+        for key, deadband in (deadbands or {}).items():
+            self.set_deadband(key, *deadband)
+
+    def set_deadband(self, key: int | tuple[int, int], threshold: float, fmt: str = '<f') -> None:
+        self._deadbands[key] = (threshold, struct.Struct(fmt))
+
+    def _deadband(self, telemetry_type: int, arg_num: int) -> tuple[float, struct.Struct] | None:
+        if not self._deadbands:
+            return None
+        deadband: tuple[float, struct.Struct] | None = self._deadbands.get((telemetry_type, arg_num))
+        return deadband if deadband is not None else self._deadbands.get(telemetry_type)
+
+    def _changed(self, state: ParameterState, value: bytes) -> bool:
+        if value == state.forwarded:
+            return False
+        deadband: tuple[float, struct.Struct] | None = self._deadband(state.telemetry_type, state.arg_num)
+        if deadband is None:
+            return True
+        threshold, codec = deadband
+        if codec.size != len(value) or codec.size != len(state.forwarded):
+            return True
+        return abs(codec.unpack(value)[0] - codec.unpack(state.forwarded)[0]) > threshold
+
+    def update(self, params: Iterable[AddrTelParameter], filetime: int | None = None) -> list[AddrTelParameter]:
+        if filetime is None:
+            filetime = filetime_now()
+        changed: list[AddrTelParameter] = []
+        states: dict[tuple[int, int], ParameterState] = self._states
+        with self._lock:
+            for param in params:
+                key: tuple[int, int] = (param.telemetry_type, param.arg_num)
+                value: bytes = param.value
+                state: ParameterState | None = states.get(key)
+                self.updates += 1
+                if state is None:
+                    states[key] = ParameterState(param.telemetry_type, param.arg_num, value, filetime)
+                    changed.append(param)
+                    continue
+                state.value = value
+                state.filetime = filetime
+                state.updates += 1
+                if self._changed(state, value):
+                    state.forwarded = value
+                    changed.append(param)
+            self.changed += len(changed)
+        return changed
+
+    def get(self, telemetry_type: int, arg_num: int) -> ParameterState | None:
+        return self._states.get((telemetry_type, arg_num))
+
+    def snapshot(self, telemetry_types: Iterable[int] | None = None) -> list[AddrTelParameter]:
+        types: frozenset[int] | None = frozenset(telemetry_types) if telemetry_types is not None else None
+        with self._lock:
+            return [state.parameter() for state in self._states.values()
+                    if types is None or state.telemetry_type in types]
+
+    def snapshot_frames(self, telemetry_types: Iterable[int] | None = None) -> list[GatewayFrame]:
+        frames: list[GatewayFrame] = []
+        params: list[AddrTelParameter] = []
+        size: int = 4
+        for param in self.snapshot(telemetry_types):
+            if params and size + param.wire_size() > MAX_ADDR_TEL_SIZE:
+                frames.append(GatewayFrame(GatewayAddrTel(*params)))
+                params, size = [], 4
+            params.append(param)
+            size += param.wire_size()
+        if params:
+            frames.append(GatewayFrame(GatewayAddrTel(*params)))
+        return frames
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'parameters': len(self._states),
+            'updates': self.updates,
+            'changed': self.changed,
+            'suppressed': self.updates - self.changed,
+        }
@@ -0,0 +1,120 @@
+from collections import deque
+from datetime import datetime
+import time
+from typing import Any, Callable
+
+from PyQt6 import QtCore, QtWidgets
+
+
+def hex_text(data: bytes) -> str:
+    return data.hex(' ').upper()
+
+
+class LogEntry:
+    __slots__ = ('timestamp', 'prefix', 'payload', 'formatter', '_text')
+
+    def __init__(self, timestamp: float, prefix: str, payload: Any, formatter: Callable[[Any], str]) -> None:
+        self.timestamp: float = timestamp
+        self.prefix: str = prefix
+        self.payload: Any = payload
+        self.formatter: Callable[[Any], str] = formatter
+        self._text: str | None = None
+
+    @property
+    def text(self) -> str:
+        """Formatted on first access, i.e. when the row becomes visible."""
+        if self._text is None:
+            ts: str = datetime.fromtimestamp(self.timestamp).isoformat(' ', 'milliseconds')
+            prefix: str = f' {self.prefix}' if self.prefix else ''
+            self._text = f'{ts}{prefix}: {self.formatter(self.payload)}'
+        return self._text
+
+
+class LogModel(QtCore.QAbstractListModel):
+    """Ring buffer of the last `capacity` log entries.
+
+    `post` may be called from any thread and only appends to a pending queue; `flush` moves pending entries into the
+    model on the GUI thread in one insert per batch, trimming the oldest rows when the capacity is exceeded.
+    """
+    def __init__(self, capacity: int = 10000, parent: QtCore.QObject | None = None) -> None:
+        super().__init__(parent)
+        self.capacity: int = capacity
+        self._entries: deque[LogEntry] = deque()
+        self._pending: deque[LogEntry] = deque(maxlen=capacity)
+        self.posted: int = 0
+
+    def post(self, payload: Any, prefix: str = '', formatter: Callable[[Any], str] = str) -> None:
+        self._pending.append(LogEntry(time.time(), prefix, payload, formatter))
+        self.posted += 1
+
+    def flush(self) -> int:
+        batch: list[LogEntry] = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if not batch:
+            return 0
+        overflow: int = len(self._entries) + len(batch) - self.capacity
+        if overflow > 0:
+            overflow = min(overflow, len(self._entries))
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self._entries.popleft()
+            self.endRemoveRows()
+        first: int = len(self._entries)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(batch) - 1)
+        self._entries.extend(batch)
+        self.endInsertRows()
+        return len(batch)
+
+    def clear(self) -> None:
+        self.beginResetModel()
+        self._entries.clear()
+        self._pending.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or index.row() >= len(self._entries):
+            return None
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self._entries[index.row()].text.replace('\n', '  ')
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            return self._entries[index.row()].text
+        return None
+
+
+class LogView(QtWidgets.QListView):
+    """Replacement for the QTextBrowser logs: a bounded LogModel refreshed by a timer at `flush_hz`.
+
+    Rows have uniform heights, so Qt asks only for the visible rows' text and hex dumps of scrolled-out frames are
+    never built. Multi-line entries are shown on one line with the full text as a tooltip.
+    """
+    def __init__(self, parent: QtWidgets.QWidget | None = None, capacity: int = 10000, flush_hz: float = 20) -> None:
+        super().__init__(parent)
+        self.log_model = LogModel(capacity, self)
+        self.setModel(self.log_model)
+        self.setUniformItemSizes(True)
+        self.setWordWrap(False)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(int(1000 / flush_hz))
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def post(self, payload: Any, prefix: str = '', formatter: Callable[[Any], str] = str) -> None:
+        self.log_model.post(payload, prefix, formatter)
+
+    def append(self, text: str) -> None:
+        self.log_model.post(text)
+
+    def flush(self) -> None:
+        scrollbar: QtWidgets.QScrollBar | None = self.verticalScrollBar()
+        follow: bool = scrollbar is None or scrollbar.value() == scrollbar.maximum()
+        if self.log_model.flush() and follow:
+            self.scrollToBottom()
+
+    def clear(self) -> None:
+        self.log_model.clear()
@@ -0,0 +1,390 @@
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from math import inf
+from threading import Lock, Thread
+from typing import Any, Callable, Iterable
+
+from loguru import logger
+
+from kpa_gateway.frame_types.base_types import FrameID
+from kpa_gateway.utils import Direction
+
+
+UNKNOWN_FRAME_ID = -1
+LATENCY_BUCKETS: tuple[float, ...] = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                                      1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_value(value: float) -> str:
+    if value == inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _json_value(value: float) -> float | None:
+    """JSON has no Infinity; an unbounded quantile is reported as null."""
+    return None if value in (inf, -inf) else value
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    pairs: list[str] = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class CounterChild:
+    def __init__(self) -> None:
+        self.value: float = 0
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        """Mirrors a total counted by another component; it must not go down."""
+        with self._lock:
+            self.value = value
+
+
+class GaugeChild:
+    def __init__(self) -> None:
+        self._value: float = 0
+        self._function: Callable[[], float] | None = None
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self._value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+
+class HistogramChild:
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds: tuple[float, ...] = bounds
+        self.counts: list[int] = [0] * (len(bounds) + 1)
+        self.sum: float = 0
+        self.count: int = 0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index: int = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def buckets(self) -> list[tuple[float, int]]:
+        cumulative: int = 0
+        result: list[tuple[float, int]] = []
+        for bound, bucket_count in zip((*self.bounds, inf), self.counts):
+            cumulative += bucket_count
+            result.append((bound, cumulative))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        rank: float = q * self.count
+        for bound, cumulative in self.buckets():
+            if cumulative >= rank and cumulative:
+                return bound
+        return 0
+
+
+class Metric:
+    kind: str = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._lock = Lock()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        """Returns the child for the label values. Hot paths should keep the child instead of calling this again."""
+        key: tuple[str, ...] = tuple(str(value) for value in values)
+        child: Any = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}, got {values}')
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values: Any) -> None:
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def children(self) -> list[tuple[tuple[str, ...], Any]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """Holds gateway metrics and exports them as Prometheus text or as a plain dict snapshot.
+
+    Collectors registered with `add_collector` run before every export to refresh values that are cheaper to read
+    on demand (worker lateness, queue depths) than to update on every event.
+    """
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+        self._lock = Lock()
+
+    def _get_or_create(self, metric_class: type, name: str, documentation: str, labelnames: Iterable[str],
+                       **kwargs: Any) -> Any:
+        with self._lock:
+            metric: Metric | None = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f'Metric {name} is already registered as {metric.kind}')
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self.collectors.append(collector)
+
+    def collect(self) -> list[Metric]:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as err:
+                logger.exception(err)
+        with self._lock:
+            return list(self.metrics.values())
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for values, child in metric.children():
+                if isinstance(child, HistogramChild):
+                    for bound, cumulative in child.buckets():
+                        labels: str = _format_labels(metric.labelnames, values, f'le="{_format_value(bound)}"')
+                        lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+                    labels = _format_labels(metric.labelnames, values)
+                    lines.append(f'{metric.name}_sum{labels} {_format_value(child.sum)}')
+                    lines.append(f'{metric.name}_count{labels} {child.count}')
+                else:
+                    labels = _format_labels(metric.labelnames, values)
+                    lines.append(f'{metric.name}{labels} {_format_value(child.value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        result: dict[str, list[dict[str, Any]]] = {}
+        for metric in self.collect():
+            samples: list[dict[str, Any]] = []
+            for values, child in metric.children():
+                sample: dict[str, Any] = {'labels': dict(zip(metric.labelnames, values))}
+                if isinstance(child, HistogramChild):
+                    sample.update(count=child.count, sum=_json_value(child.sum),
+                                  p50=_json_value(child.quantile(0.5)), p99=_json_value(child.quantile(0.99)),
+                                  p999=_json_value(child.quantile(0.999)))
+                else:
+                    sample['value'] = _json_value(child.value)
+                samples.append(sample)
+            result[metric.name] = samples
+        return result
+
+
+class MetricsServer:
+    """Serves `/metrics` (Prometheus text format) and `/snapshot` (JSON) from a registry on a local port."""
+    def __init__(self, registry: MetricsRegistry, port: int = 9464, host: str = '127.0.0.1') -> None:
+        self.registry: MetricsRegistry = registry
+        self.host: str = host
+        self.port: int = port
+        self._httpd: ThreadingHTTPServer | None = None
+        self._thread: Thread | None = None
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        registry: MetricsRegistry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path.startswith('/metrics'):
+                    body: bytes = registry.render().encode()
+                    content_type: str = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.startswith('/snapshot'):
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        if self._httpd is None:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+            self.port = self._httpd.server_address[1]
+            self._thread = Thread(name='metrics_server', daemon=True, target=self._httpd.serve_forever)
+            self._thread.start()
+            logger.debug(f'metrics available on http://{self.host}:{self.port}/metrics')
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+
+class GatewayMetrics:
+    """API_Gateway pipeline metrics with the per-FrameID children resolved up front for the hot path."""
+    def __init__(self, registry: MetricsRegistry | None = None) -> None:
+        self.registry: MetricsRegistry = registry if registry else MetricsRegistry()
+        reg: MetricsRegistry = self.registry
+        self.frames = reg.counter('gateway_frames_total', 'Frames by FrameID and direction',
+                                  ('frame_id', 'direction'))
+        self.bytes = reg.counter('gateway_bytes_total', 'Frame bytes by FrameID and direction',
+                                 ('frame_id', 'direction'))
+        self.parse_errors = reg.counter('gateway_parse_errors_total', 'Malformed input by stage', ('stage',))
+        self.parse_seconds = reg.histogram('gateway_parse_seconds', 'Frame parse time', ('frame_id',))
+        self.dispatch_seconds = reg.histogram('gateway_dispatch_seconds',
+                                              'Time from deframing to handler start, executor queueing included',
+                                              ('frame_id',))
+        self.handler_seconds = reg.histogram('gateway_handler_seconds', 'Handler execution time', ('frame_id',))
+        self.worker_ticks = reg.gauge('gateway_worker_ticks', 'Worker ticks since start', ('worker',))
+        self.worker_missed = reg.gauge('gateway_worker_missed_ticks', 'Worker ticks skipped as late', ('worker',))
+        self.worker_lateness = reg.gauge('gateway_worker_lateness_seconds', 'Lateness of the last worker tick',
+                                         ('worker',))
+        self.worker_max_lateness = reg.gauge('gateway_worker_max_lateness_seconds', 'Largest worker tick lateness',
+                                             ('worker',))
+        self.send_queue_depth = reg.gauge('gateway_send_queue_bytes', 'Bytes waiting to be sent per client',
+                                          ('client',))
+        self.handler_pending = reg.gauge('gateway_handler_pending', 'Handler tasks queued or running')
+        self.subscriber_depth = reg.gauge('gateway_subscriber_queue_frames', 'Frames waiting per subscriber',
+                                          ('subscriber',))
+        self.subscriber_lag = reg.gauge('gateway_subscriber_lag_seconds',
+                                        'Age of the oldest frame waiting per subscriber', ('subscriber',))
+        self.subscriber_dropped = reg.counter('gateway_subscriber_dropped_total', 'Frames dropped per subscriber',
+                                              ('subscriber',))
+        self.subscriber_conflated = reg.counter('gateway_subscriber_conflated_total',
+                                                'Frames replaced by a newer one', ('subscriber',))
+        self.ingress_limited = reg.counter('gateway_ingress_limited_total', 'Received frames over an ingress limit',
+                                           ('limit', 'action'))
+        self.ingress_held = reg.gauge('gateway_ingress_held_frames', 'Received frames held back by DELAY limits')
+        self._traffic: dict[tuple[int, Direction], tuple[CounterChild, CounterChild]] = {}
+        self._timings: dict[int, tuple[HistogramChild, HistogramChild, HistogramChild]] = {}
+        for frame_id in FrameID:
+            self._timings[frame_id.value] = self._resolve_timings(frame_id.value)
+            for direction in Direction:
+                self._traffic[frame_id.value, direction] = self._resolve_traffic(frame_id.value, direction)
+        # ids off the wire that are not a FrameID share one label, so a client cannot grow the label set
+        self._unknown_traffic: dict[Direction, tuple[CounterChild, CounterChild]] = {
+            direction: self._resolve_traffic(UNKNOWN_FRAME_ID, direction) for direction in Direction}
+        self._unknown_timings: tuple[HistogramChild, HistogramChild, HistogramChild] = \
+            self._resolve_timings(UNKNOWN_FRAME_ID)
+
+    @staticmethod
+    def _label(frame_id: int) -> str:
+        try:
+            return FrameID(frame_id).name
+        except ValueError:
+            return 'unknown'
+
+    def _resolve_traffic(self, frame_id: int, direction: Direction) -> tuple[CounterChild, CounterChild]:
+        label: str = self._label(frame_id)
+        return (self.frames.labels(label, direction.name.lower()), self.bytes.labels(label, direction.name.lower()))
+
+    def _resolve_timings(self, frame_id: int) -> tuple[HistogramChild, HistogramChild, HistogramChild]:
+        label: str = self._label(frame_id)
+        return (self.parse_seconds.labels(label), self.dispatch_seconds.labels(label),
+                self.handler_seconds.labels(label))
+
+    def count(self, direction: Direction, frame_id: int, size: int) -> None:
+        children: tuple[CounterChild, CounterChild] | None = self._traffic.get((frame_id, direction))
+        if children is None:
+            children = self._unknown_traffic[direction]
+        children[0].inc()
+        children[1].inc(size)
+
+    def parse_error(self, stage: str) -> None:
+        self.parse_errors.labels(stage).inc()
+
+    def forget_subscriber(self, name: str) -> None:
+        for metric in (self.subscriber_depth, self.subscriber_lag, self.subscriber_dropped, self.subscriber_conflated):
+            metric.remove(name)
+
+    def timings(self, frame_id: int) -> tuple[HistogramChild, HistogramChild, HistogramChild]:
+        """(parse, dispatch, handler) histograms of the frame type."""
+        return self._timings.get(frame_id, self._unknown_timings)
+
+    def snapshot(self) -> dict[str, list[dict[str, Any]]]:
+        return self.registry.snapshot()
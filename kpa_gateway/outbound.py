@@ -0,0 +1,146 @@
+from collections import deque
+from enum import Enum
+from socket import socket
+from threading import Condition, Thread
+import time
+from typing import Callable
+
+from loguru import logger
+
+
+MAX_IOV = 512  # buffers per sendmsg call, well below IOV_MAX on the supported platforms
+
+
+class ClientRole(Enum):
+    ATS = 'ats'
+    FEEDER = 'feeder'
+    EMULATOR = 'emulator'
+
+
+class OutboundQueue:
+    """Send queue of one client connection, drained by its own writer thread.
+
+    `send` only appends the encoded frame, so it has the same signature as `socket.send` and can be used wherever
+    the socket was. The writer waits at most `flush_deadline` seconds after the oldest pending frame (or until
+    `batch_bytes` are pending) and then writes everything queued with one `sendmsg` call. When more than `max_frames`
+    frames are waiting new ones are dropped and counted.
+    """
+    def __init__(self, sock: socket, name: str = '', max_frames: int = 4096, flush_deadline: float = 0.001, *,
+                 batch_bytes: int = 65536, on_sent: Callable[[bytes], None] | None = None) -> None:
+        self.sock: socket = sock
+        self.name: str = name
+        self.max_frames: int = max_frames
+        self.flush_deadline: float = flush_deadline
+        self.batch_bytes: int = batch_bytes
+        self.on_sent: Callable[[bytes], None] | None = on_sent
+        self._frames: deque[bytes] = deque()
+        self._pending_bytes: int = 0
+        self._oldest: float = 0
+        self._cond = Condition()
+        self._closed: bool = False
+        self.sent_frames: int = 0
+        self.sent_bytes: int = 0
+        self.writes: int = 0
+        self.dropped: int = 0
+        self.max_depth: int = 0
+        self._thread = Thread(name=f'outbound_{name}', daemon=True, target=self._routine)
+        self._thread.start()
+
+    def send(self, data: bytes) -> int:
+        with self._cond:
+            if self._closed or len(self._frames) >= self.max_frames:
+                self.dropped += 1
+                return 0
+            if not self._frames:
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            self._frames.append(data)
+            self._pending_bytes += len(data)
+            self.max_depth = max(self.max_depth, len(self._frames))
+            if self._pending_bytes >= self.batch_bytes:
+                self._cond.notify()
+        return len(data)
+
+    def put(self, data: bytes, timeout: float | None = None) -> bool:
+        """Like `send`, but waits up to `timeout` seconds for room instead of dropping the frame."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or len(self._frames) < self.max_frames, timeout):
+                return False
+            if self._closed:
+                return False
+            return self.send(data) > 0  # the condition's RLock is reentrant
+
+    def queue_depth(self) -> int:
+        return self._pending_bytes
+
+    def stats(self) -> dict[str, int | float]:
+        with self._cond:
+            return {
+                'pending_frames': len(self._frames),
+                'pending_bytes': self._pending_bytes,
+                'max_depth': self.max_depth,
+                'sent_frames': self.sent_frames,
+                'sent_bytes': self.sent_bytes,
+                'writes': self.writes,
+                'frames_per_write': self.sent_frames / self.writes if self.writes else 0,
+                'dropped': self.dropped,
+            }
+
+    def close(self, timeout: float = 1) -> None:
+        """Stops accepting frames, lets the writer send what is already queued and waits for it."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> list[bytes] | None:
+        with self._cond:
+            while not self._frames and not self._closed:
+                self._cond.wait()
+            if not self._frames:
+                return None
+            deadline: float = self._oldest + self.flush_deadline
+            while not self._closed and self._pending_bytes < self.batch_bytes:
+                remaining: float = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch: list[bytes] = [self._frames.popleft() for _ in range(min(len(self._frames), MAX_IOV))]
+            self._pending_bytes -= sum(map(len, batch))
+            if self._frames:
+                self._oldest = time.monotonic()
+            self._cond.notify_all()  # wake producers waiting in put
+            return batch
+
+    def _write(self, batch: list[bytes]) -> None:
+        if not hasattr(self.sock, 'sendmsg'):  # Windows sockets have no sendmsg
+            self.sock.sendall(b''.join(batch))
+            self.writes += 1
+            return
+        views: deque[memoryview] = deque(memoryview(data) for data in batch)
+        while views:
+            sent: int = self.sock.sendmsg(views)
+            self.writes += 1
+            while views and sent >= len(views[0]):
+                sent -= len(views.popleft())
+            if views and sent:
+                views[0] = views[0][sent:]
+
+    def _routine(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            try:
+                self._write(batch)
+            except OSError as err:
+                logger.debug(f'outbound {self.name}: {err}')
+                with self._cond:
+                    self._closed = True
+                    self.dropped += len(batch) + len(self._frames)
+                    self._frames.clear()
+                    self._pending_bytes = 0
+                    self._cond.notify_all()
+                return
+            self.sent_frames += len(batch)
+            self.sent_bytes += sum(map(len, batch))
+            if self.on_sent:
+                for data in batch:
+                    self.on_sent(data)
@@ -0,0 +1,351 @@
+import asyncio
+from enum import Enum
+import inspect
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import os
+import struct
+from threading import Lock, Thread
+import time
+from typing import Any, Callable, Hashable, Iterable
+import weakref
+
+from loguru import logger
+
+from kpa_gateway.frame_parser import FrameHeader, GatewayFrame
+from kpa_gateway.frame_types.base_types import FrameID
+from kpa_gateway.frame_types.control_command import GatewayCMD
+from kpa_gateway.frame_types.position_telemetry import GatewayPosTel
+from kpa_gateway.frame_types.receipt import GatewayReceipt
+from kpa_gateway.outbound import ClientRole
+
+
+SHARDED_FRAME_IDS: tuple[int, ...] = (FrameID.CMD.value, FrameID.POSITION_TELEMETRY.value)
+ROLE_BITS: dict[ClientRole, int] = {role: 1 << index for index, role in enumerate(ClientRole)}
+LENGTH = struct.Struct('<I')
+INBOUND = struct.Struct('<I')  # connection id
+RETURN = struct.Struct('<IH')  # connection id (0: by role), role bits
+HEAD, TAIL, FLAGS = 0, 8, 16  # 8 byte words of the ring header, head and tail on separate cache lines
+DATA = 192  # byte offset of the records
+WRAP = 0xFFFFFFFF
+IDLE_CHECK_SEC = 0.5  # how often a blocked consumer looks for a stopped ring or a dead parent
+
+
+class ShardBy(Enum):
+    CONNECTION = 'connection'  # frames of one client are handled in order by one worker
+    # frames of one cmd_type/cmd_code or telemetry_type are handled in order by one worker; commands of one client
+    # may be spread over workers, so their receipts can come back out of order
+    ROUTE = 'route'
+
+
+class Backoff:
+    """Polling delay for a producer waiting for room in a full ring: a few yields, then sleeps growing up to
+    `max_sleep`."""
+    def __init__(self, spins: int = 64, min_sleep: float = 0.00005, max_sleep: float = 0.001) -> None:
+        self.spins: int = spins
+        self.min_sleep: float = min_sleep
+        self.max_sleep: float = max_sleep
+        self._idle: int = 0
+        self._sleep: float = min_sleep
+
+    def reset(self) -> None:
+        self._idle = 0
+        self._sleep = self.min_sleep
+
+    def wait(self) -> None:
+        self._idle += 1
+        if self._idle < self.spins:
+            time.sleep(0)
+            return
+        time.sleep(self._sleep)
+        self._sleep = min(self._sleep * 2, self.max_sleep)
+
+
+class ShmRing:
+    """Single producer, single consumer ring of length-prefixed records in a SharedMemory block.
+
+    Head and tail are ever-increasing byte counters, read and written as aligned 8 byte words through a 'Q' view
+    (struct packs byte by byte, so a reader could see a torn counter). The producer writes the record before
+    publishing the new head, the consumer copies it out before publishing the new tail. A record that does not fit
+    before the end of the buffer is preceded by a wrap marker.
+
+    Every record put releases `ready` once, so the consumer blocks in `wait` instead of polling an empty ring;
+    several rings drained by one consumer may share a semaphore. Pickling (for spawned workers) attaches to the
+    block by name.
+    """
+    def __init__(self, capacity: int, name: str | None = None, ready: Any = None) -> None:
+        self.capacity: int = capacity
+        self.ready: Any = ready if ready is not None else multiprocessing.Semaphore(0)
+        self.owner: bool = name is None
+        self.shm = SharedMemory(name, create=self.owner, size=DATA + capacity if self.owner else 0)
+        self.buf: memoryview = self.shm.buf  # type: ignore
+        if self.owner:
+            self.buf[:DATA] = bytes(DATA)
+        self.words: memoryview = self.buf[:DATA].cast('Q')
+
+    def __getstate__(self) -> tuple[int, str, Any]:
+        return self.capacity, self.shm.name, self.ready
+
+    def __setstate__(self, state: tuple[int, str, Any]) -> None:
+        self.__init__(*state)  # type: ignore
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.words[FLAGS])
+
+    def close(self) -> None:
+        self.words[FLAGS] = 1
+        self.ready.release()  # wakes a consumer blocked in wait
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until a record was put (or the ring closed); False on timeout."""
+        return self.ready.acquire(timeout=timeout)
+
+    def depth(self) -> int:
+        return self.words[HEAD] - self.words[TAIL]
+
+    def put(self, header: bytes, data: bytes | memoryview) -> bool:
+        size: int = LENGTH.size + len(header) + len(data)
+        head: int = self.words[HEAD]
+        tail: int = self.words[TAIL]
+        pos: int = head % self.capacity
+        pad: int = self.capacity - pos if self.capacity - pos < size else 0
+        if size + pad > self.capacity - (head - tail):
+            return False
+        if pad:
+            if pad >= LENGTH.size:
+                LENGTH.pack_into(self.buf, DATA + pos, WRAP)
+            head += pad
+            pos = 0
+        start: int = DATA + pos + LENGTH.size
+        LENGTH.pack_into(self.buf, DATA + pos, len(header) + len(data))
+        self.buf[start:start + len(header)] = header
+        self.buf[start + len(header):start + len(header) + len(data)] = data
+        self.words[HEAD] = head + size
+        self.ready.release()
+        return True
+
+    def get(self) -> bytes | None:
+        head: int = self.words[HEAD]
+        tail: int = self.words[TAIL]
+        if tail == head:
+            return None
+        pos: int = tail % self.capacity
+        if self.capacity - pos < LENGTH.size or LENGTH.unpack_from(self.buf, DATA + pos)[0] == WRAP:
+            tail += self.capacity - pos
+            pos = 0
+        length: int = LENGTH.unpack_from(self.buf, DATA + pos)[0]
+        start: int = DATA + pos + LENGTH.size
+        record: bytes = bytes(self.buf[start:start + length])
+        self.words[TAIL] = tail + LENGTH.size + length
+        return record
+
+    def release(self, unlink: bool = False) -> None:
+        self.words.release()
+        self.buf = None  # type: ignore
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class ShardContext:
+    """Stands in for API_Gateway in handlers running in a shard process; frames go back through the return ring."""
+    def __init__(self, ring: ShmRing, index: int) -> None:
+        self.ring: ShmRing = ring
+        self.index: int = index
+
+    def send_to(self, roles: Iterable[ClientRole], frame: GatewayFrame) -> None:
+        bits: int = 0
+        for role in roles:
+            bits |= ROLE_BITS[role]
+        _put(self.ring, RETURN.pack(0, bits), frame.to_bytes())
+
+    def send_ats(self, frame: GatewayFrame) -> None:
+        self.send_to((ClientRole.ATS, ClientRole.EMULATOR), frame)
+
+    def send_feeder(self, frame: GatewayFrame) -> None:
+        self.send_to((ClientRole.FEEDER,), frame)
+
+
+def _put(ring: ShmRing, header: bytes, data: bytes | memoryview, timeout: float | None = None) -> bool:
+    """Waits for room in `ring` until `timeout` (forever if None) or until the ring is closed."""
+    if ring.put(header, data):
+        return True
+    backoff = Backoff()
+    deadline: float | None = None if timeout is None else time.monotonic() + timeout
+    while not ring.closed:
+        backoff.wait()
+        if ring.put(header, data):
+            return True
+        if deadline is not None and time.monotonic() > deadline:
+            return False
+    return False
+
+
+def _handle(record: bytes, context: ShardContext) -> None:
+    conn_id: int = INBOUND.unpack_from(record)[0]
+    raw_frame: memoryview = memoryview(record)[INBOUND.size:]
+    header: FrameHeader = GatewayFrame.peek(raw_frame)
+    if header.frame_id == FrameID.CMD.value:
+        func: Callable | None = GatewayCMD.route(header.cmd_type, header.cmd_code)  # type: ignore
+        if func is None:
+            return
+        result: Any = func(*GatewayFrame.parse(raw_frame, lazy=True).frame.args)  # type: ignore
+        if inspect.isawaitable(result):
+            result = asyncio.run(result)
+        receipt: bytes = GatewayFrame(GatewayReceipt(GatewayCMD.frame_id.value, not result)).to_bytes()
+        _put(context.ring, RETURN.pack(conn_id, 0), receipt)
+    elif header.frame_id == FrameID.POSITION_TELEMETRY.value:
+        func = GatewayPosTel.route(header.telemetry_type)  # type: ignore
+        if func is not None:
+            result = func(context, GatewayFrame.parse(raw_frame).frame.tmi_data)  # type: ignore
+            if inspect.isawaitable(result):
+                asyncio.run(result)
+
+
+def shard_main(index: int, inbound: ShmRing, outbound: ShmRing) -> None:
+    """Worker process: parses frames from `inbound` and runs the handlers registered with the gateway decorators
+    (inherited on fork, registered again by the module import on spawn)."""
+    context = ShardContext(outbound, index)
+    parent: int = os.getppid()
+    while True:
+        record: bytes | None = inbound.get() if inbound.wait(IDLE_CHECK_SEC) else None
+        if record is None:
+            if inbound.closed or os.getppid() != parent:  # stopped, or the gateway died without stopping us
+                break
+            continue
+        try:
+            _handle(record, context)
+        except ValueError as err:
+            logger.error(f'shard {index}: {err}')
+        except Exception as err:
+            logger.exception(err)
+    inbound.release()
+    outbound.release()
+
+
+class ShardPool:
+    """Runs CMD and POSITION_TELEMETRY handlers in `workers` processes fed through shared-memory rings.
+
+    The acceptor keeps deframing, metrics and logging and only copies raw frames into the ring of the shard chosen
+    by `shard_by`; a thread drains the return rings and hands receipts and frames sent by handlers to `on_return`.
+    The return rings share one semaphore, so that thread sleeps until any worker puts a record.
+    """
+    def __init__(self, on_return: Callable[[Any, int, bytes], None], workers: int | None = None,
+                 shard_by: ShardBy = ShardBy.CONNECTION, ring_size: int = 4 * 1024 * 1024, *,
+                 put_timeout: float = 1.0, mp_context: str | None = None) -> None:
+        self.on_return: Callable[[Any, int, bytes], None] = on_return
+        self.workers: int = workers or max((os.cpu_count() or 2) - 1, 1)
+        self.shard_by: ShardBy = shard_by
+        self.ring_size: int = ring_size
+        self.put_timeout: float = put_timeout
+        self._context = multiprocessing.get_context(mp_context)
+        self.inbound: list[ShmRing] = []
+        self.returns: list[ShmRing] = []
+        self._locks: list[Lock] = []
+        self.processes: list[Any] = []
+        self._conn_ids: weakref.WeakKeyDictionary[Any, int] = weakref.WeakKeyDictionary()
+        self._connections: weakref.WeakValueDictionary[int, Any] = weakref.WeakValueDictionary()
+        self._next_conn_id: int = 1
+        self._thread: Thread | None = None
+        self._running: bool = False
+        self._returned: Any = None
+        self.submitted: list[int] = []
+        self.dropped: int = 0
+
+    def start(self) -> None:
+        self._returned = self._context.Semaphore(0)
+        for index in range(self.workers):
+            inbound = ShmRing(self.ring_size, ready=self._context.Semaphore(0))
+            outbound = ShmRing(self.ring_size, ready=self._returned)
+            process = self._context.Process(target=shard_main, args=(index, inbound, outbound),
+                                            name=f'gateway_shard_{index}', daemon=True)
+            process.start()
+            self.inbound.append(inbound)
+            self.returns.append(outbound)
+            self._locks.append(Lock())
+            self.processes.append(process)
+            self.submitted.append(0)
+        self._running = True
+        self._thread = Thread(name='shard_returns', daemon=True, target=self._drain_returns)
+        self._thread.start()
+
+    def conn_id(self, connection: Any) -> int:
+        conn_id: int | None = self._conn_ids.get(connection)
+        if conn_id is None:
+            conn_id = self._conn_ids[connection] = self._next_conn_id
+            self._connections[conn_id] = connection
+            self._next_conn_id += 1
+        return conn_id
+
+    def shard(self, key: Hashable, conn_id: int) -> int:
+        return (conn_id if self.shard_by == ShardBy.CONNECTION else hash(key)) % self.workers
+
+    def try_submit(self, key: Hashable, raw_frame: bytes, connection: Any) -> bool:
+        conn_id: int = self.conn_id(connection)
+        index: int = self.shard(key, conn_id)
+        with self._locks[index]:
+            if not self.inbound[index].put(INBOUND.pack(conn_id), raw_frame):
+                return False
+        self.submitted[index] += 1
+        return True
+
+    def submit(self, key: Hashable, raw_frame: bytes, connection: Any) -> bool:
+        """Waits up to `put_timeout` for room in the shard's ring, then drops the frame."""
+        if self.try_submit(key, raw_frame, connection):
+            return True
+        conn_id: int = self.conn_id(connection)
+        index: int = self.shard(key, conn_id)
+        with self._locks[index]:
+            if _put(self.inbound[index], INBOUND.pack(conn_id), raw_frame, self.put_timeout):
+                self.submitted[index] += 1
+                return True
+        self.dropped += 1
+        logger.warning(f'shard {index} is full, frame dropped')
+        return False
+
+    def _drain_returns(self) -> None:
+        while self._running:
+            if not self._returned.acquire(timeout=IDLE_CHECK_SEC):
+                continue
+            for ring in self.returns:  # one record was put into one of them
+                record: bytes | None = ring.get()
+                if record is None:
+                    continue
+                conn_id, role_bits = RETURN.unpack_from(record)
+                try:
+                    self.on_return(self._connections.get(conn_id) if conn_id else None, role_bits,
+                                   record[RETURN.size:])
+                except Exception as err:
+                    logger.exception(err)
+                break
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'alive': sum(process.is_alive() for process in self.processes),
+            'submitted': list(self.submitted),
+            'inbound_depth': [ring.depth() for ring in self.inbound],
+            'return_depth': [ring.depth() for ring in self.returns],
+            'dropped': self.dropped,
+        }
+
+    def stop(self, timeout: float = 2) -> None:
+        for ring in self.inbound + self.returns:
+            ring.close()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._running = False
+        self._returned.release()
+        if self._thread:
+            self._thread.join(timeout)
+        for ring in self.inbound + self.returns:
+            ring.release(unlink=True)
+        self.inbound, self.returns, self._locks, self.processes = [], [], [], []
+
+
+def roles_from_bits(role_bits: int) -> tuple[ClientRole, ...]:
+    return tuple(role for role, bit in ROLE_BITS.items() if role_bits & bit)
+
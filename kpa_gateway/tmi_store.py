@@ -0,0 +1,348 @@
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+import mmap
+from pathlib import Path
+import struct
+from threading import Lock
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+from loguru import logger
+
+from kpa_gateway.utils import HUNDREDS_OF_NANOSECONDS, dt_to_filetime, filetime_now
+
+
+SEGMENT_MAGIC = b'KPATMI01'
+RECORD_HEADER = struct.Struct('<QQI')  # receive filetime, frame filetime, payload length
+INDEX_ENTRY = struct.Struct('<QQ')  # receive filetime, record offset
+POS_TEL_PAYLOAD = 16  # length, filetime, frame id, telemetry type, size
+
+
+class TmiRecord(NamedTuple):
+    received: int  # FILETIME ticks on the gateway clock, the key of the time index
+    filetime: int  # FILETIME ticks from the frame header
+    telemetry_type: int
+    data: memoryview
+
+
+def _ticks(value: datetime | int | None) -> int | None:
+    return dt_to_filetime(value) if isinstance(value, datetime) else value
+
+
+class Segment:
+    """One file of a partition: records appended into a preallocated mmap plus a sparse time index.
+
+    The index gets an entry for the first record and then one per `index_interval` bytes, so a lookup is a bisect
+    followed by a short scan. Sealed segments are truncated to their used length; a segment left preallocated by a
+    crash, or still mapped by a reader when it was sealed, ends at the first zero record header. `used` is the
+    length of the written records either way. The lock orders `records` taking a view of the mapping against
+    `seal` and `close` replacing or closing it.
+    """
+    def __init__(self, path: Path, start: int, size: int = 0, index_interval: int = 65536) -> None:
+        self.path: Path = path
+        self.start: int = start
+        self.index_interval: int = index_interval
+        self.writable: bool = size > 0
+        self.times: array = array('Q')
+        self.offsets: array = array('Q')
+        self.last: int = start
+        self._index_file: BinaryIO | None = None
+        self._lock = Lock()
+        if self.writable:
+            with path.open('w+b') as file:
+                file.truncate(size)
+                self._mmap = mmap.mmap(file.fileno(), size)
+            self._mmap[:len(SEGMENT_MAGIC)] = SEGMENT_MAGIC
+            self.used: int = len(SEGMENT_MAGIC)
+            self._index_file = index_path(path).open('wb')
+        else:
+            with path.open('rb') as file:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._mmap[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                raise ValueError(f'{path} is not a TMI segment')
+            self.used = self._load_index()
+        self._last_indexed: int = self.offsets[-1] if self.offsets else 0
+
+    def _load_index(self) -> int:
+        """Reads the sidecar index and scans the records after its last entry to find the end of the data."""
+        idx: Path = index_path(self.path)
+        if idx.exists():
+            raw: bytes = idx.read_bytes()
+            for received, offset in INDEX_ENTRY.iter_unpack(raw[:len(raw) // INDEX_ENTRY.size * INDEX_ENTRY.size]):
+                if offset + RECORD_HEADER.size > len(self._mmap):
+                    break
+                self.times.append(received)
+                self.offsets.append(offset)
+        ptr: int = self.offsets[-1] if self.offsets else len(SEGMENT_MAGIC)
+        last_indexed: int = ptr if self.offsets else -self.index_interval
+        while ptr + RECORD_HEADER.size <= len(self._mmap):
+            received, _, length = RECORD_HEADER.unpack_from(self._mmap, ptr)
+            end: int = ptr + RECORD_HEADER.size + length
+            if not received or end > len(self._mmap):
+                break
+            if ptr - last_indexed >= self.index_interval:
+                self.times.append(received)
+                self.offsets.append(ptr)
+                last_indexed = ptr
+            self.last = received
+            ptr = end
+        return ptr
+
+    @property
+    def size(self) -> int:
+        """Length of the written records, which is what retention counts; an untruncated file may be longer."""
+        return self.used
+
+    def fits(self, length: int) -> bool:
+        return self.used + RECORD_HEADER.size + length <= len(self._mmap)
+
+    def append(self, received: int, filetime: int, data: bytes | memoryview) -> None:
+        ptr: int = self.used
+        start: int = ptr + RECORD_HEADER.size
+        self._mmap[start:start + len(data)] = data
+        RECORD_HEADER.pack_into(self._mmap, ptr, received, filetime, len(data))
+        if not self.offsets or ptr - self._last_indexed >= self.index_interval:
+            entry: bytes = INDEX_ENTRY.pack(received, ptr)
+            self.times.append(received)
+            self.offsets.append(ptr)
+            self._last_indexed = ptr
+            self._index_file.write(entry)  # type: ignore
+        self.last = received
+        self.used = start + len(data)  # published last, so readers never see a partial record
+
+    def records(self, telemetry_type: int, start: int | None, end: int | None) -> Iterator[TmiRecord]:
+        limit: int = self.used
+        ptr: int = len(SEGMENT_MAGIC)
+        if start is not None and self.times:
+            position: int = bisect_right(self.times, start) - 1
+            if position >= 0:
+                ptr = self.offsets[position]
+        with self._lock:
+            if self._mmap.closed:
+                return
+            view: memoryview = memoryview(self._mmap)
+        unpack = RECORD_HEADER.unpack_from
+        while ptr + RECORD_HEADER.size <= limit:
+            received, filetime, length = unpack(view, ptr)
+            if not received or (end is not None and received > end):
+                return
+            data_start: int = ptr + RECORD_HEADER.size
+            ptr = data_start + length
+            if start is None or received >= start:
+                yield TmiRecord(received, filetime, telemetry_type, view[data_start:ptr])
+
+    def seal(self) -> None:
+        """Stops appending: flushes the index and shrinks the file to the used length."""
+        with self._lock:
+            if not self.writable:
+                return
+            self.writable = False
+            self._mmap.flush()
+            if self._index_file:
+                self._index_file.close()
+                self._index_file = None
+            try:
+                self._mmap.close()
+            except BufferError:  # a reader still holds records of this segment, keep the preallocated tail
+                logger.debug(f'{self.path} is in use, not truncated')
+                return
+            with self.path.open('r+b') as file:
+                file.truncate(self.used)
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        self.seal()
+        with self._lock:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # left to the garbage collector once the exported records are gone
+
+    def delete(self) -> bool:
+        self.close()
+        try:
+            self.path.unlink(missing_ok=True)
+            index_path(self.path).unlink(missing_ok=True)
+        except OSError as err:  # Windows refuses to delete mapped files
+            logger.debug(f'{self.path}: {err}')
+            return False
+        return True
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + '.idx')
+
+
+class Partition:
+    """Segments of one telemetry type, named by the receive time of their first record."""
+    def __init__(self, path: Path, telemetry_type: int, segment_size: int, segment_sec: float,
+                 index_interval: int) -> None:
+        self.path: Path = path
+        self.telemetry_type: int = telemetry_type
+        self.segment_size: int = segment_size
+        self.segment_ticks: int = int(segment_sec * HUNDREDS_OF_NANOSECONDS)
+        self.index_interval: int = index_interval
+        self.lock = Lock()
+        path.mkdir(parents=True, exist_ok=True)
+        self.segments: list[Segment] = []
+        for segment_path in sorted(path.glob('*.seg')):
+            try:
+                self.segments.append(Segment(segment_path, int(segment_path.stem), index_interval=index_interval))
+            except (ValueError, OSError) as err:
+                logger.error(f'TMI store: skipping {segment_path}: {err}')
+        self.active: Segment | None = None
+        self.last: int = self.segments[-1].last if self.segments else 0
+
+    @property
+    def size(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    def append(self, received: int, filetime: int, data: bytes | memoryview) -> bool:
+        """Returns True when a new segment was started, i.e. when retention should be checked."""
+        rolled: bool = False
+        with self.lock:
+            received = max(received, self.last)  # the index needs non-decreasing times, resyncs may step back
+            active: Segment | None = self.active
+            if active is None or not active.fits(len(data)) or received - active.start >= self.segment_ticks:
+                if active is not None:
+                    active.seal()
+                if self.segments and received <= self.segments[-1].start:
+                    received = self.segments[-1].start + 1  # segment names must stay unique
+                size: int = max(self.segment_size, len(SEGMENT_MAGIC) + RECORD_HEADER.size + len(data))
+                active = self.active = Segment(self.path / f'{received:020d}.seg', received, size,
+                                               self.index_interval)
+                self.segments.append(active)
+                rolled = True
+            active.append(received, filetime, data)
+            self.last = received
+        return rolled
+
+    def query(self, start: int | None, end: int | None) -> Iterator[TmiRecord]:
+        segments: list[Segment] = self.segments[:]  # appends and retention replace entries under the lock
+        for position, segment in enumerate(segments):
+            if end is not None and segment.start > end:
+                return
+            following: Segment | None = segments[position + 1] if position + 1 < len(segments) else None
+            if start is not None and following is not None and following.start <= start:
+                continue
+            yield from segment.records(self.telemetry_type, start, end)
+
+    def expire(self, max_bytes: int | None, min_received: int | None) -> int:
+        removed: int = 0
+        with self.lock:
+            total: int = self.size
+            while len(self.segments) > 1:  # the newest segment is always kept
+                oldest: Segment = self.segments[0]
+                too_big: bool = max_bytes is not None and total > max_bytes
+                too_old: bool = min_received is not None and self.segments[1].start <= min_received
+                if not too_big and not too_old:
+                    break
+                size: int = oldest.size
+                if not oldest.delete():
+                    break
+                self.segments.pop(0)
+                total -= size
+                removed += 1
+        return removed
+
+    def close(self) -> None:
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments.clear()
+            self.active = None
+
+
+class TmiStore:
+    """Append-only position telemetry history under `path`, one directory per telemetry type.
+
+    Payloads are appended to memory-mapped segments of `segment_size` bytes; a new segment is started when the
+    current one is full or older than `segment_sec`. Whole segments are deleted once a partition exceeds
+    `max_bytes` or their records are older than `max_age_sec`. `query` yields records of a time window as views
+    into the mapped files, so nothing is copied or loaded beyond the pages actually read; the views stay valid
+    until the store is closed.
+    """
+    def __init__(self, path: str | Path, telemetry_types: Iterable[int] | None = None, *,
+                 segment_size: int = 64 * 1024 * 1024, segment_sec: float = 3600, index_interval: int = 65536,
+                 max_bytes: int | None = None, max_age_sec: float | None = None) -> None:
+        self.path = Path(path)
+        self.telemetry_types: frozenset[int] | None = frozenset(telemetry_types) if telemetry_types else None
+        self.segment_size: int = segment_size
+        self.segment_sec: float = segment_sec
+        self.index_interval: int = index_interval
+        self.max_bytes: int | None = max_bytes
+        self.max_age_sec: float | None = max_age_sec
+        self.partitions: dict[int, Partition] = {}
+        self._lock = Lock()
+        self.records: int = 0
+        self.expired: int = 0
+        self.path.mkdir(parents=True, exist_ok=True)
+        for partition_path in sorted(self.path.iterdir()):
+            if partition_path.is_dir() and partition_path.name.isdigit():
+                self._partition(int(partition_path.name))
+        self.expire()
+
+    def _partition(self, telemetry_type: int) -> Partition:
+        partition: Partition | None = self.partitions.get(telemetry_type)
+        if partition is None:
+            with self._lock:
+                partition = self.partitions.get(telemetry_type)
+                if partition is None:
+                    partition = Partition(self.path / str(telemetry_type), telemetry_type, self.segment_size,
+                                          self.segment_sec, self.index_interval)
+                    self.partitions = {**self.partitions, telemetry_type: partition}
+        return partition
+
+    def accepts(self, telemetry_type: int) -> bool:
+        return self.telemetry_types is None or telemetry_type in self.telemetry_types
+
+    def append(self, telemetry_type: int, data: bytes | memoryview, filetime: int = 0,
+               received: int | None = None) -> None:
+        if not self.accepts(telemetry_type):
+            return
+        if received is None:
+            received = filetime_now()
+        if self._partition(telemetry_type).append(received, filetime or received, data):
+            self.expire()
+        self.records += 1
+
+    def append_frame(self, raw_frame: bytes | memoryview, telemetry_type: int, filetime: int) -> None:
+        """Stores the payload of an undecoded POSITION_TELEMETRY gateway frame."""
+        if self.accepts(telemetry_type):
+            self.append(telemetry_type, memoryview(raw_frame)[POS_TEL_PAYLOAD:], filetime)
+
+    def query(self, telemetry_type: int, start: datetime | int | None = None,
+              end: datetime | int | None = None) -> Iterator[TmiRecord]:
+        """Records with `start <= received <= end` (datetimes or FILETIME ticks) in arrival order."""
+        partition: Partition | None = self.partitions.get(telemetry_type)
+        if partition is None:
+            return iter(())
+        return partition.query(_ticks(start), _ticks(end))
+
+    def expire(self) -> int:
+        if self.max_bytes is None and self.max_age_sec is None:
+            return 0
+        min_received: int | None = None
+        if self.max_age_sec is not None:
+            min_received = filetime_now() - int(self.max_age_sec * HUNDREDS_OF_NANOSECONDS)
+        removed: int = sum(partition.expire(self.max_bytes, min_received)
+                           for partition in list(self.partitions.values()))
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict[int, dict[str, int]]:
+        return {telemetry_type: {'segments': len(partition.segments), 'bytes': partition.size,
+                                 'first': partition.segments[0].start if partition.segments else 0,
+                                 'last': partition.last}
+                for telemetry_type, partition in self.partitions.items()}
+
+    def flush(self) -> None:
+        for partition in list(self.partitions.values()):
+            with partition.lock:
+                if partition.active is not None:
+                    partition.active._mmap.flush()
+
+    def close(self) -> None:
+        for partition in list(self.partitions.values()):
+            partition.close()
+        self.partitions = {}
@@ -1,16 +1,82 @@
-from calendar import timegm
-from datetime import UTC, datetime
+from datetime import datetime, timedelta
+from enum import IntEnum
+import time
 
 
 EPOCH_AS_FILETIME = 116444736000000000  # January 1, 1970 as MS file time
 HUNDREDS_OF_NANOSECONDS = 10000000
+FILETIME_EPOCH = datetime(1601, 1, 1)
+CLOCK_RESYNC_SEC = 60.0
 
 
 def dt_to_filetime(dt: datetime) -> int:
-    if (dt.tzinfo is None) or (dt.tzinfo.utcoffset(dt) is None):
-        dt = dt.replace(tzinfo=UTC)
-    return EPOCH_AS_FILETIME + (timegm(dt.timetuple()) * HUNDREDS_OF_NANOSECONDS)
+    """100 ns ticks since 1601 of the wall-clock fields of `dt` (tzinfo is not applied, as before)."""
+    delta: timedelta = dt.replace(tzinfo=None) - FILETIME_EPOCH
+    return (delta.days * 86400 + delta.seconds) * HUNDREDS_OF_NANOSECONDS + delta.microseconds * 10
 
 
 def filetime_to_dt(filetime_timestamp: int) -> datetime:
-    return datetime.fromtimestamp((filetime_timestamp - EPOCH_AS_FILETIME) / HUNDREDS_OF_NANOSECONDS)
+    """Inverse of `dt_to_filetime`, exact down to the microsecond."""
+    return FILETIME_EPOCH + timedelta(microseconds=filetime_timestamp // 10)
+
+
+class Direction(IntEnum):
+    RX = 0
+    TX = 1
+
+
+class FiletimeClock:
+    """Wall clock in FILETIME ticks that advances with `time.monotonic_ns`.
+
+    The wall time is read once per `resync_sec` (which also picks up DST and NTP corrections); in between, ticks
+    are the anchor plus elapsed monotonic time, so stamping a frame costs one clock read and no datetime objects.
+    """
+    def __init__(self, resync_sec: float = CLOCK_RESYNC_SEC) -> None:
+        self.resync_ns: int = int(resync_sec * 1e9)
+        self._anchor_ticks: int = 0
+        self._anchor_ns: int = 0
+        self.resync()
+
+    def resync(self) -> None:
+        self._anchor_ns = time.monotonic_ns()
+        self._anchor_ticks = dt_to_filetime(datetime.now())
+
+    def now(self) -> int:
+        elapsed_ns: int = time.monotonic_ns() - self._anchor_ns
+        if elapsed_ns > self.resync_ns:
+            self.resync()
+            elapsed_ns = time.monotonic_ns() - self._anchor_ns
+        return self._anchor_ticks + elapsed_ns // 100
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate: float = rate
+        self.burst: float = burst if burst else max(rate, 1)
+        self.tokens: float = self.burst
+        self.updated: float = time.monotonic()
+
+    def _refill(self) -> None:
+        now: float = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def reserve(self) -> float:
+        """Takes a token even if there is none yet; returns the seconds to wait until it is really available."""
+        self._refill()
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+default_clock = FiletimeClock()
+
+
+def filetime_now() -> int:
+    return default_clock.now()
@@ -1,41 +1,149 @@
-from threading import Lock, Thread
+import heapq
+from itertools import count
+from threading import Condition, Lock, Thread
 import time
 from typing import Callable, Iterable
 
 from loguru import logger
 
 
+class Scheduler:
+    """Runs periodic workers from one timer thread using a heap of deadlines on the monotonic clock.
+
+    Deadlines advance by whole periods from the previous deadline, so handler runtime does not shift the phase.
+    Ticks which could not run in time are skipped and counted in `Worker.missed`.
+    """
+    def __init__(self, name: str = 'scheduler') -> None:
+        self.name: str = name
+        self._heap: list[tuple[float, int, 'Worker']] = []
+        self._seq = count()
+        self._cond = Condition()
+        self._thread: Thread | None = None
+        self._running_flag: bool = False
+
+    def add(self, worker: 'Worker') -> None:
+        with self._cond:
+            now: float = time.monotonic()
+            worker._anchor = now
+            self._push(worker, now + worker.period_sec)
+            self._ensure_thread()
+
+    def remove(self, worker: 'Worker') -> None:
+        with self._cond:
+            worker._seq = None  # its heap entry becomes stale and is dropped when reached
+            self._cond.notify()
+
+    def reschedule(self, worker: 'Worker') -> None:
+        with self._cond:
+            if worker._seq is None:
+                return
+            self._push(worker, max(worker._anchor + worker.period_sec, time.monotonic()))
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._running_flag = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def _push(self, worker: 'Worker', deadline: float) -> None:
+        seq: int = next(self._seq)
+        worker._seq = seq
+        worker.next_deadline = deadline
+        heapq.heappush(self._heap, (deadline, seq, worker))
+        self._cond.notify()
+
+    def _ensure_thread(self) -> None:
+        if not self._running_flag:
+            self._running_flag = True
+            self._thread = Thread(name=self.name, daemon=True, target=self._routine)
+            self._thread.start()
+
+    def _routine(self) -> None:
+        while True:
+            with self._cond:
+                worker: Worker | None = None
+                while self._running_flag and worker is None:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    deadline, seq, candidate = self._heap[0]
+                    if candidate._seq != seq:
+                        heapq.heappop(self._heap)
+                        continue
+                    now: float = time.monotonic()
+                    if deadline > now:
+                        self._cond.wait(deadline - now)
+                        continue
+                    heapq.heappop(self._heap)
+                    lateness: float = now - deadline
+                    missed: int = int(lateness // candidate.period_sec) if candidate.period_sec > 0 else 0
+                    candidate._anchor = deadline + missed * candidate.period_sec
+                    candidate._tick(lateness, missed)
+                    self._push(candidate, candidate._anchor + candidate.period_sec)
+                    worker = candidate
+                if not self._running_flag:
+                    return
+            worker._run()
+
+
+_default_scheduler: Scheduler | None = None
+
+
+def default_scheduler() -> Scheduler:
+    global _default_scheduler  # noqa: PLW0603
+    if _default_scheduler is None:
+        _default_scheduler = Scheduler()
+    return _default_scheduler
+
+
 class Worker:
-    def __init__(self, name: str, period_sec: float, target: Callable, args: Iterable) -> None:
+    def __init__(self, name: str, period_sec: float, target: Callable, args: Iterable,
+                 scheduler: Scheduler | None = None) -> None:
         self.name: str = name
         self.period_sec: float = period_sec
         self.target: Callable = target
         self.args: Iterable = args
+        self.scheduler: Scheduler = scheduler if scheduler else default_scheduler()
 
-        self._thread: Thread
+        self.ticks: int = 0
+        self.missed: int = 0
+        self.last_lateness: float = 0
+        self.max_lateness: float = 0
+        self.next_deadline: float = 0
+        self._anchor: float = 0
+        self._seq: int | None = None
         self._running_flag: bool = False
         self._lock = Lock()
 
     def set_period(self, new_period_sec: float) -> None:
         self.period_sec = new_period_sec
+        if self._running_flag:
+            self.scheduler.reschedule(self)
 
     def start(self) -> None:
         if not self._running_flag:
             self._running_flag = True
-            self._thread = Thread(name=self.name, daemon=True, target=self._routine)
-            self._thread.start()
+            self.scheduler.add(self)
             logger.debug(f'{self.name} started')
 
     def stop(self) -> None:
         if self._running_flag:
             self._running_flag = False
-            self._thread.join(1)
+            self.scheduler.remove(self)
 
-    def _routine(self) -> None:
-        while self._running_flag:
-            counter = 0
-            while counter < self.period_sec and self._running_flag:
-                time.sleep(0.005)
-                counter += 0.005
-            with self._lock:
+    def _tick(self, lateness: float, missed: int) -> None:
+        self.ticks += 1
+        self.missed += missed
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        if missed:
+            logger.warning(f'{self.name} missed {missed} deadline(s), late by {lateness:.3f} s')
+
+    def _run(self) -> None:
+        with self._lock:
+            try:
                 self.target(*self.args)
+            except Exception as err:
+                logger.exception(err)